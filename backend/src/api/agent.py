@@ -1,12 +1,34 @@
+import ast
+import asyncio
+from collections import defaultdict, deque
+import copy
 from datetime import datetime
-import difflib
+from functools import cached_property, lru_cache
+import hashlib
 import os
-import tempfile
-import traceback
-from typing import List, Optional, Dict, Any
-import json
+import re
+from typing import (
+    TYPE_CHECKING,
+    Iterator,
+    List,
+    Optional,
+    Dict,
+    Any,
+    Tuple,
+    TypedDict,
+)
+from cachetools import TTLCache
+import msgspec
+import orjson
+from loguru import logger
 import google.generativeai as genai
-import pandas as pd
+import numpy as np
+from jsonpath_ng import JSONPath
+from jsonpath_ng.ext import parse as parse_jsonpath
+import pyarrow as pa
+import pyarrow.compute as pc
+from rapidfuzz import fuzz, process as fuzz_process
+import statsapi
 from src.api.models import (
     Specificity,
     MLBResponse,
@@ -21,19 +43,578 @@ from src.api.models import (
     DataRetrievalPlan,
 )
 from src.api.repl import MLBPythonREPL
+from src.core import load_homeruns_table
 from src.core.settings import settings
-from src.api.utils import sanitize_code, translate_response
+from src.api.utils import sanitize_code, strip_code_fences, translate_response
 from src.api.gemini_solid import GeminiSolid
+from src.api.cache import SemanticCache, cache_key
+from src.api.batching import MicroBatcher
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Shared schema leaves; genai copies the schema before use, so reuse is safe
+_STR = {"type": "string"}
+_STR_ARR = {"type": "array", "items": _STR}
+
+# Structured-output schema for create_data_plan, built once at import
+_PLAN_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "steps": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": _STR,
+                    "type": _STR,
+                    "name": _STR,
+                    "description": _STR,
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "source_step": _STR,
+                            "source_path": _STR,
+                            "filter": _STR,
+                            "value": _STR,
+                        },
+                    },
+                    "extract": {
+                        "type": "object",
+                        "properties": {
+                            "fields": {
+                                "type": "object",
+                                "properties": {
+                                    "player_ids": _STR,
+                                    "names": _STR,
+                                    "stats": _STR,
+                                    "info": _STR,
+                                    "team_ids": _STR,
+                                    "game_ids": _STR,
+                                    "dates": _STR,
+                                    "scores": _STR,
+                                },
+                            },
+                            "filter": _STR,
+                        },
+                        "required": ["fields"],
+                    },
+                    "depends_on": _STR_ARR,
+                    "required_for": _STR_ARR,
+                },
+                "required": [
+                    "id",
+                    "type",
+                    "name",
+                    "description",
+                    "parameters",
+                    "extract",
+                    "depends_on",
+                ],
+            },
+        },
+        "dependencies": {
+            "type": "object",
+            "properties": {
+                "step1": _STR_ARR,
+                "step2": _STR_ARR,
+            },
+        },
+    },
+    "required": ["steps", "dependencies"],
+}
+
+_NUM = {"type": "number"}
+
+# Structured-output schema for the media plan; direct_media items mirror the
+# frontend's MediaItem
+_MEDIA_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "direct_media": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": _STR,
+                    "url": _STR,
+                    "title": _STR,
+                    "description": _STR,
+                    "metadata": {
+                        "type": "object",
+                        "properties": {
+                            "exit_velocity": _NUM,
+                            "launch_angle": _NUM,
+                            "distance": _NUM,
+                            "year": {"type": "integer"},
+                        },
+                    },
+                },
+                "required": ["type", "url"],
+            },
+        },
+        "homerun_search": {
+            "type": "object",
+            "properties": {
+                "keywords": _STR_ARR,
+                "stats_criteria": {
+                    "type": "object",
+                    "properties": {
+                        "min_exit_velocity": _NUM,
+                        "max_exit_velocity": _NUM,
+                        "min_launch_angle": _NUM,
+                        "max_launch_angle": _NUM,
+                        "min_distance": _NUM,
+                        "max_distance": _NUM,
+                    },
+                },
+                "player_names": _STR_ARR,
+            },
+        },
+    },
+    "required": ["direct_media", "homerun_search"],
+}
+
+_BOOL = {"type": "boolean"}
+_INT = {"type": "integer"}
+
+
+def _enum_schema(enum_cls: type) -> Dict[str, Any]:
+    return {"type": "string", "format": "enum", "enum": [m.value for m in enum_cls]}
+
+
+def _object_schema(properties: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+# IntentAnalysis as a dict schema, so it can be nested in the combined schema
+_INTENT_RESPONSE_SCHEMA = _object_schema(
+    {
+        "intent": _object_schema(
+            {
+                "type": _enum_schema(IntentType),
+                "description": _STR,
+                "specificity": _enum_schema(Specificity),
+                "timeframe": _enum_schema(Timeframe),
+                "complexity": _enum_schema(Complexity),
+            }
+        ),
+        "entities": _object_schema(
+            {
+                key: _STR_ARR
+                for key in ("teams", "players", "dates", "stats", "locations", "events")
+            }
+        ),
+        "context": _object_schema(
+            {
+                "time_frame": _enum_schema(Timeframe),
+                "comparison_type": _enum_schema(ComparisonType),
+                "stat_focus": _enum_schema(StatFocus),
+                "sentiment": _enum_schema(Sentiment),
+                "requires_data": _BOOL,
+                "follow_up": _BOOL,
+                "data_requirements": _STR_ARR,
+            }
+        ),
+        "is_mlb_related": _BOOL,
+        "description": _STR,
+    }
+)
+
+# Batched intent analyses carry their query number, so they can be matched back
+_INTENT_BATCH_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": _object_schema({"index": _INT, "analysis": _INTENT_RESPONSE_SCHEMA}),
+}
+
+# Structured-output schema for analyze_and_plan
+_COMBINED_RESPONSE_SCHEMA = _object_schema(
+    {"intent": _INTENT_RESPONSE_SCHEMA, "plan": _PLAN_RESPONSE_SCHEMA}
+)
+
+# Fallback plans used when plan generation fails; callers get a deep copy
+_STANDINGS_FALLBACK_PLAN = {
+    "steps": [
+        {
+            "id": "basic_data",
+            "type": "function",
+            "name": "standings",
+            "description": "Get basic MLB data",
+            "parameters": {"value": "leagueId=103,104"},
+            "extract": {
+                "fields": {
+                    "stats": "$.records[*].teamRecords[*]",
+                    "info": "$.records[*].division",
+                }
+            },
+            "depends_on": [],
+        }
+    ],
+    "dependencies": {},
+}
+_SCHEDULE_FALLBACK_PLAN = {
+    "steps": [
+        {
+            "id": "basic_data",
+            "type": "function",
+            "name": "schedule",
+            "description": "Get basic MLB data",
+            "parameters": {"value": "sportId=1"},
+            "extract": {
+                "fields": {
+                    "stats": "$.dates[*].games[*]",
+                    "info": "$.dates[*].date",
+                }
+            },
+            "depends_on": [],
+        }
+    ],
+    "dependencies": {},
+}
+
+# Intent analysis runs on settings.INTENT_MODEL; this one is the retry on bad JSON
+_INTENT_ESCALATION_MODEL = "gemini-1.5-flash"
+
+
+class _IndexedIntent(TypedDict):
+    index: int
+    analysis: IntentAnalysis
+
+
+# Typed decoders: enum fields come back as enum members, unknown values raise
+_INTENT_DECODER = msgspec.json.Decoder(IntentAnalysis)
+_INTENT_BATCH_DECODER = msgspec.json.Decoder(list[_IndexedIntent])
+
+
+class _IntentAndPlan(TypedDict):
+    intent: IntentAnalysis
+    plan: Dict[str, Any]
+
+
+_COMBINED_DECODER = msgspec.json.Decoder(_IntentAndPlan)
+
+# Canned suggestions are never mutated, so every response shares one tuple
+_DEFAULT_SUGGESTIONS = (
+    "Tell me about today's games",
+    "Who are the top players this season?",
+    "Show me the latest standings",
+    "What are some exciting home runs?",
+    "Tell me about your favorite baseball moment",
+)
+
+# Fixed fields of the error response; data and context are set per call
+_ERROR_RESPONSE = {
+    "message": "I encountered an issue processing your request.",
+    "conversation": "I apologize, but I ran into a technical issue. Could you try rephrasing your question?",
+    "data_type": "error",
+    "suggestions": (
+        "Try asking about today's games",
+        "Look up a specific player",
+        "Check team standings",
+    ),
+    "media": None,
+}
+
+# Endpoints whose data changes during a game; always fetched fresh
+_LIVE_ENDPOINTS = frozenset({"game", "schedule"})
+
+# Intent returned when analysis fails; callers get a deep copy
+_DEFAULT_INTENT = {
+    "is_mlb_related": False,
+    "intent": {
+        "type": IntentType.CONVERSATION,
+        "description": "General conversation",
+        "specificity": Specificity.GENERAL,
+        "timeframe": Timeframe.CURRENT,
+        "complexity": Complexity.SIMPLE,
+    },
+    "entities": {
+        "teams": [],
+        "players": [],
+        "dates": [],
+        "stats": [],
+        "locations": [],
+        "events": [],
+    },
+    "context": {
+        "time_frame": Timeframe.CURRENT,
+        "comparison_type": ComparisonType.NONE,
+        "stat_focus": StatFocus.NONE,
+        "sentiment": Sentiment.NEUTRAL,
+        "requires_data": False,
+        "follow_up": False,
+        "data_requirements": [],
+    },
+}
+
+
+def _numeric_view(column: pa.ChunkedArray) -> np.ndarray:
+    """NumPy view of a numeric column: zero-copy without nulls, else NaN-filled"""
+    array = column.combine_chunks()
+    if array.null_count:
+        array = pc.fill_null(pc.cast(array, pa.float64()), np.nan)
+    return array.to_numpy(zero_copy_only=False)
+
+
+# ${step.field} placeholders embedded in parameter strings
+_PLACEHOLDER_RE = re.compile(r"\$\{([^}]+)\}")
+
+# Marks a reference that does not resolve against prior results
+_MISSING = object()
+
+# Keys kept per object when describing prior results to the model
+_SCHEMA_MAX_KEYS = 40
+
+
+@lru_cache(maxsize=4096)
+def _compile_jsonpath(expression: str) -> JSONPath:
+    """Parse a JSONPath expression once; generated plans reuse the same paths"""
+    return parse_jsonpath(expression)
+
+
+@lru_cache(maxsize=1024)
+def _reference_keys(reference: str) -> Tuple[str, ...]:
+    """Split a $step.field reference into its lookup keys once"""
+    return tuple(reference[1:].lstrip(".").split("."))
+
+
+def _parameter_references(value: Any) -> Iterator[str]:
+    """
+    Every $step.field reference nested in a step's parameters, whether a whole
+    value or a ${step.field} placeholder inside a parameter string
+    """
+    if isinstance(value, str):
+        if "${" in value:
+            for inner in _PLACEHOLDER_RE.findall(value):
+                yield f"${inner}"
+        elif value.startswith("$"):
+            yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _parameter_references(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _parameter_references(item)
+
+
+def _referenced_step_ids(step: Dict[str, Any], step_ids: Any) -> set:
+    """Ids among step_ids that a step's parameters read results from"""
+    parameters = step.get("parameters") or {}
+    found = {_reference_keys(ref)[0] for ref in _parameter_references(parameters)}
+    if isinstance(parameters, dict) and parameters.get("source_step"):
+        found.add(parameters["source_step"])
+    found.discard(step["id"])
+    return found.intersection(step_ids)
+
+
+def _lookup_reference(data: Any, reference: str) -> Any:
+    """The value a $step.field reference points at, or _MISSING"""
+    for key in _reference_keys(reference):
+        if isinstance(data, dict) and key in data:
+            data = data[key]
+        elif isinstance(data, list) and key.isdigit() and int(key) < len(data):
+            data = data[int(key)]
+        else:
+            return _MISSING
+    return data
+
+
+def _schema_of(value: Any, depth: int = 4) -> Any:
+    """Nested keys and value types of a payload, lists described by their first item"""
+    if isinstance(value, dict):
+        if not depth:
+            return "object"
+        keys = list(value)[:_SCHEMA_MAX_KEYS]
+        return {str(key): _schema_of(value[key], depth - 1) for key in keys}
+    if isinstance(value, list):
+        if not value or not depth:
+            return "array"
+        return [_schema_of(value[0], depth - 1)]
+    return type(value).__name__
+
+
+def _prior_results_view(parameters: Any, prior_results: Dict[str, Any]) -> Any:
+    """
+    What a parameter prompt needs from prior results: the values the parameters
+    reference plus the results' schema. Falls back to the full results when
+    nothing is referenced or a reference does not resolve here.
+    """
+    if not prior_results or not isinstance(parameters, dict):
+        return prior_results
+
+    values = {}
+    source_step = parameters.get("source_step")
+    if source_step:
+        if source_step not in prior_results:
+            return prior_results
+        source_path = parameters.get("source_path")
+        if not source_path:
+            return prior_results
+        try:
+            path = _compile_jsonpath(source_path)
+        except Exception:
+            return prior_results
+        matches = [match.value for match in path.find(prior_results[source_step])]
+        if not matches:
+            return prior_results
+        values[f"{source_step}:{source_path}"] = matches
+
+    others = {k: v for k, v in parameters.items() if k != "source_path"}
+    for reference in sorted(set(_parameter_references(others))):
+        value = _lookup_reference(prior_results, reference)
+        if value is _MISSING:
+            return prior_results
+        values[reference] = value
+
+    if not values:
+        return prior_results
+    return {"referenced_values": values, "schema": _schema_of(prior_results)}
+
+
+def _parse_call_arguments(value: Any) -> Optional[Tuple[list, Dict[str, Any]]]:
+    """Literal args and kwargs from a resolved 'teamId=143, season=2025' string"""
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    try:
+        # The model sometimes returns the argument string as a quoted literal
+        unquoted = ast.literal_eval(text)
+        if isinstance(unquoted, str):
+            text = unquoted
+    except (SyntaxError, ValueError):
+        pass
+
+    try:
+        call = ast.parse(f"f({text})", mode="eval").body
+        args = [ast.literal_eval(arg) for arg in call.args]
+        kwargs = {kw.arg: ast.literal_eval(kw.value) for kw in call.keywords}
+    except (SyntaxError, ValueError, TypeError):
+        return None
+    # **unpacking and list-valued arguments need the generated aggregation code
+    if None in kwargs or any(
+        isinstance(v, (list, tuple, set)) for v in [*args, *kwargs.values()]
+    ):
+        return None
+    return args, kwargs
+
+
+def _dumps(obj: Any) -> str:
+    """
+    Compact orjson serialization of a payload for a prompt; indentation would
+    only add tokens. Enums are written as their values, non-string keys are
+    stringified and any other unknown type falls back to str.
+    """
+    return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _payload_shape(data: Any) -> Any:
+    """Top-level layout of a payload: its keys, or the keys of its first item"""
+    if isinstance(data, dict):
+        return sorted(map(str, data))
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        return [sorted(map(str, data[0]))]
+    return type(data).__name__
+
+
+def _escape_braces(text: str) -> str:
+    """Escape text for embedding in a str.format template"""
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class _StepScanner:
+    """
+    Scans a streamed JSON response and returns each object of its "steps"
+    array as soon as the object's closing brace arrives.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._key = None  # last string, while only ':' or whitespace follows
+        self._steps_depth = None
+        self._found = False
+        self._done = False
+        self._item_start = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        start = len(self._text)
+        self._text += chunk
+        text = self._text
+        items = []
+        for pos in range(start, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._key = text[self._string_start + 1 : pos]
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+                continue
+            if char.isspace() or char == ":":
+                continue
+
+            if char in "{[":
+                self._depth += 1
+                if char == "[" and self._key == "steps" and self._steps_depth is None:
+                    self._steps_depth = self._depth
+                elif (
+                    char == "{"
+                    and not self._done
+                    and self._steps_depth is not None
+                    and self._depth == self._steps_depth + 1
+                ):
+                    self._item_start = pos
+            elif char in "}]":
+                if (
+                    self._item_start is not None
+                    and self._depth == self._steps_depth + 1
+                ):
+                    try:
+                        items.append(orjson.loads(text[self._item_start : pos + 1]))
+                        self._found = True
+                    except orjson.JSONDecodeError:
+                        pass
+                    self._item_start = None
+                elif self._depth == self._steps_depth:
+                    # An array of non-objects under some other "steps" key is skipped
+                    self._done = self._found
+                    if not self._found:
+                        self._steps_depth = None
+                self._depth -= 1
+            self._key = None
+        return items
 
 
 class MLBAgent:
+    # (section, key, enum, default) for every enum field of an IntentAnalysis
+    _ENUM_FIELDS = (
+        ("intent", "type", IntentType, IntentType.CONVERSATION),
+        ("intent", "specificity", Specificity, Specificity.GENERAL),
+        ("intent", "timeframe", Timeframe, Timeframe.CURRENT),
+        ("intent", "complexity", Complexity, Complexity.SIMPLE),
+        ("context", "time_frame", Timeframe, Timeframe.CURRENT),
+        ("context", "comparison_type", ComparisonType, ComparisonType.NONE),
+        ("context", "stat_focus", StatFocus, StatFocus.NONE),
+        ("context", "sentiment", Sentiment, Sentiment.NEUTRAL),
+    )
+
     def __init__(
         self,
         api_key: str,
-        endpoints_json: str,
-        functions_json: str,
-        media_json: str,
-        charts_json: str,
+        endpoints: Dict[str, Any],
+        functions: Dict[str, Any],
+        media: Dict[str, Any],
+        charts: Dict[str, Any],
     ):
         genai.configure(api_key=api_key)
 
@@ -41,32 +622,109 @@ class MLBAgent:
         self.gemini = GeminiSolid()
 
         # Data
-        self.endpoints = json.loads(endpoints_json)["endpoints"]
-        self.functions = json.loads(functions_json)["functions"]
-        self.homeruns = pd.read_csv("src/core/constants/mlb_homeruns.csv")
-        self.media_source = json.loads(media_json)["sources"]
-        self.charts_docs = json.loads(charts_json)["charts"]
+        # Shared across instances, treat as read-only
+        self.endpoints = endpoints["endpoints"]
+        self.functions = functions["functions"]
+        self.media_source = media["sources"]
+        self.charts_docs = charts["charts"]
+
+        # Function docs by name, for O(1) lookup per step
+        self._functions_by_name = {f["name"]: f for f in self.functions}
+
+        # Step types and names a generated plan may reference
+        self._valid_types = frozenset(("function", "endpoint"))
+        self._valid_methods = frozenset(self.endpoints.keys()) | frozenset(
+            self._functions_by_name
+        )
+
+        # Serialized once and shared by every prompt that embeds the catalogs
+        self._functions_json_str = _dumps(self.functions)
+        self._endpoints_json_str = _dumps(self.endpoints)
+        self._media_source_json_str = _dumps(self.media_source)
+        self._charts_docs_json_str = _dumps(self.charts_docs)
 
         self.user_query = ""
         self.intent = None
         self.plan = None
-        self.repl = MLBPythonREPL(timeout=8)
+        self.repl = MLBPythonREPL(timeout=8, workers=settings.REPL_WORKERS)
+        # Caps concurrent step execution across every plan in flight
+        self._step_slots = asyncio.Semaphore(settings.MAX_PARALLEL_STEPS)
+
+        # Semantically equivalent queries reuse a previous intent analysis
+        self.intent_cache = SemanticCache(
+            threshold=0.87, path=os.path.join(settings.CACHE_DIR, "intent")
+        )
+        # Plans are only reused for an identical intent shape: nearby intents can differ
+        # in a single player or team, which must not share a plan
+        self.plan_cache = SemanticCache(threshold=None, maxsize=256)
+        # Generated code and resolved parameters are deterministic in their
+        # inputs, so identical requests reuse them across restarts
+        self.code_cache = SemanticCache(
+            threshold=None, path=os.path.join(settings.CACHE_DIR, "code")
+        )
+        self.params_cache = SemanticCache(
+            threshold=None, path=os.path.join(settings.CACHE_DIR, "params")
+        )
+        self._params_inflight: Dict[str, asyncio.Future] = {}
+        # Response bodies by URL, so repeated requests across sessions skip the
+        # MLB API until the endpoint's data may have changed
+        self._http_cache = TTLCache(maxsize=1024, ttl=settings.HTTP_CACHE_TTL)
+        # Media plans for an identical query, intent and data payload
+        self.media_cache = SemanticCache(threshold=None, maxsize=1024)
+        self.intent_batcher = MicroBatcher(
+            self._analyze_intent_batch,
+            max_batch=settings.INTENT_MAX_BATCH,
+            max_wait=settings.INTENT_BATCH_WINDOW_MS / 1000,
+        )
 
         self._setup_prompts()
         # print(self.endpoints)
 
-    def _setup_prompts(self):
-        """Set up all prompts used by the agent"""
-        self.intent_prompt = f"""
-            Available MLB Stats API Functions:
-            {json.dumps(self.functions, indent=2)}
+    @cached_property
+    def _homeruns_table(self) -> pa.Table:
+        """Homerun clips, mapped on the first media or highlight request"""
+        return load_homeruns_table()
+
+    @cached_property
+    def homeruns(self) -> "pd.DataFrame":
+        """Homerun clips as an Arrow-backed DataFrame, built on first access"""
+        import pandas as pd
+
+        return self._homeruns_table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    @cached_property
+    def _sample_homerun_json_str(self) -> str:
+        """First 15 homeruns in DataFrame.to_dict() layout, serialized once"""
+        sample = self._homeruns_table.slice(0, 15)
+        return _dumps(
+            {
+                name: dict(enumerate(column.to_pylist()))
+                for name, column in zip(sample.column_names, sample.columns)
+            }
+        )
 
-            Available Endpoints:
-            {json.dumps(self.endpoints, indent=2)}
+    @cached_property
+    def _homerun_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Stat columns for filtering and ranking, as float32 with NaN for nulls.
+        Half the width of float64 is plenty for thresholds and a weighted sum;
+        reported values are read back from the table at full precision.
+        """
+        table = self._homeruns_table
+        return {
+            name: _numeric_view(table[name]).astype(np.float32)
+            for name in ("ExitVelocity", "LaunchAngle", "HitDistance")
+        }
 
-            Current Date: {datetime.now().isoformat()}
+    @cached_property
+    def _homerun_titles(self) -> np.ndarray:
+        """Lower-cased homerun titles, in row order, for fuzzy matching"""
+        titles = pc.fill_null(pc.utf8_lower(self._homeruns_table["title"]), "")
+        return titles.to_numpy(zero_copy_only=False)
 
-            History of messages: {{context}}
+    def _setup_prompts(self):
+        """Set up all prompts used by the agent"""
+        intent_guide = """
             Please analyze the baseball query and return a structured JSON response with detailed intent analysis, and if mlb related.
 
             COMMON MLB QUERIES AND HOW TO UNDERSTAND THEM:
@@ -138,15 +796,15 @@ class MLBAgent:
             - Wants: Schedule information
             - Focus: Season timeline
             - Data needed: Season schedule, current date
+            """
+        self.intent_prompt = f"""
+            Available MLB Stats API Functions:
+            {self._functions_json_str}
 
-                Query to analyze: """
-        self.plan_prompt = f"""Create an optimized MLB data retrieval plan that leverages data flow relationships.
-
-Available Resources:
-Functions: {json.dumps(self.functions, indent=2)}
-Endpoints: {json.dumps(self.endpoints, indent=2)}
-
-PLANNING PRINCIPLES:
+            Available Endpoints:
+            {self._endpoints_json_str}
+{intent_guide}"""
+        plan_guide = """PLANNING PRINCIPLES:
 1. Data Flow Optimization
 - Follow recommended next steps from endpoints/functions
 - Use established data pipelines for common scenarios
@@ -165,316 +823,316 @@ PLANNING PRINCIPLES:
 COMPREHENSIVE EXAMPLE PATTERNS:
 
 1. Advanced Judge's Career Analysis:
-{{
+{
     "steps": [
-        {{
+        {
             "id": "player_lookup",
             "type": "function",
             "name": "lookup_player",
             "description": "Get player ID and basic info",
-            "parameters": {{
+            "parameters": {
                 "value": "names=Judge"
-            }},
-            "extract": {{
-                "fields": {{
+            },
+            "extract": {
+                "fields": {
                     "player_ids": "$.players[*].id",
                     "names": "$.players[*].fullName",
                     "team_ids": "$.players[*].currentTeam.id"
-                }}
-            }},
+                }
+            },
             "depends_on": []
-        }},
-        {{
+        },
+        {
             "id": "career_stats",
             "type": "function",
             "name": "player_stat_data",
             "description": "Get career statistics",
-            "parameters": {{
-                "value": "personIds=${{player_lookup.player_ids}}&group=hitting,pitching&type=yearByYear"
-            }},
-            "extract": {{
-                "fields": {{
+            "parameters": {
+                "value": "personIds=${player_lookup.player_ids}&group=hitting,pitching&type=yearByYear"
+            },
+            "extract": {
+                "fields": {
                     "stats": "$.stats[*].splits[*]",
                     "info": "$.stats[*].group"
-                }}
-            }},
+                }
+            },
             "depends_on": ["player_lookup"]
-        }},
-        {{
+        },
+        {
             "id": "league_context",
             "type": "function",
             "name": "league_leader_data",
             "description": "Get league context for performance",
-            "parameters": {{
+            "parameters": {
                 "value": "leaderCategories=homeRuns,battingAverage&season=2024"
-            }},
-            "extract": {{
-                "fields": {{
+            },
+            "extract": {
+                "fields": {
                     "stats": "$.leagueLeaders[*]",
                     "info": "$.leagueLeaders[*].person"
-                }}
-            }},
+                }
+            },
             "depends_on": ["career_stats"]
-        }}
+        }
     ],
-    "dependencies": {{
+    "dependencies": {
         "career_stats": ["player_lookup"],
         "league_context": ["career_stats"]
-    }}
-}}
+    }
+}
 
 2. Team Performance Analysis:
-{{
+{
     "steps": [
-        {{
+        {
             "id": "team_lookup",
             "type": "function",
             "name": "lookup_team",
             "description": "Get team ID and basic info",
-            "parameters": {{
+            "parameters": {
                 "value": "teamId=143"
-            }},
-            "extract": {{
-                "fields": {{
+            },
+            "extract": {
+                "fields": {
                     "team_ids": "$.teams[0].id",
                     "names": "$.teams[0].name",
                     "info": "$.teams[0].league"
-                }}
-            }},
+                }
+            },
             "depends_on": []
-        }},
-        {{
+        },
+        {
             "id": "team_stats",
             "type": "function",
             "name": "team_stats",
             "description": "Get detailed team statistics",
-            "parameters": {{
-                "value": "teamId=${{team_lookup.team_ids}}&stats=season&group=hitting,pitching,fielding"
-            }},
-            "extract": {{
-                "fields": {{
+            "parameters": {
+                "value": "teamId=${team_lookup.team_ids}&stats=season&group=hitting,pitching,fielding"
+            },
+            "extract": {
+                "fields": {
                     "stats": "$.stats[*].splits[*]",
                     "info": "$.stats[*].group"
-                }}
-            }},
+                }
+            },
             "depends_on": ["team_lookup"]
-        }},
-        {{
+        },
+        {
             "id": "roster_info",
             "type": "function",
             "name": "roster",
             "description": "Get current team roster",
-            "parameters": {{
-                "value": "teamId=${{team_lookup.team_ids}}&rosterType=active"
-            }},
-            "extract": {{
-                "fields": {{
+            "parameters": {
+                "value": "teamId=${team_lookup.team_ids}&rosterType=active"
+            },
+            "extract": {
+                "fields": {
                     "player_ids": "$.roster[*].person.id",
                     "names": "$.roster[*].person.fullName",
                     "info": "$.roster[*].position"
-                }}
-            }},
+                }
+            },
             "depends_on": ["team_lookup"]
-        }}
+        }
     ],
-    "dependencies": {{
+    "dependencies": {
         "team_stats": ["team_lookup"],
         "roster_info": ["team_lookup"]
-    }}
-}}
+    }
+}
 
 3. Game Analysis with Play-by-Play:
-{{
+{
     "steps": [
-        {{
+        {
             "id": "schedule_lookup",
             "type": "function",
             "name": "schedule",
             "description": "Get game schedule and identifiers",
-            "parameters": {{
+            "parameters": {
                 "value": "date=2024-01-24&teamId=143"
-            }},
-            "extract": {{
-                "fields": {{
+            },
+            "extract": {
+                "fields": {
                     "game_ids": "$.dates[0].games[*].gamePk",
                     "dates": "$.dates[0].date",
                     "team_ids": "$.dates[0].games[*].teams.home.team.id"
-                }}
-            }},
+                }
+            },
             "depends_on": []
-        }},
-        {{
+        },
+        {
             "id": "game_playbyplay",
             "type": "function",
             "name": "game_playByPlay",
             "description": "Get detailed play-by-play data",
-            "parameters": {{
-                "value": "gamePk=${{schedule_lookup.game_ids}}"
-            }},
-            "extract": {{
-                "fields": {{
+            "parameters": {
+                "value": "gamePk=${schedule_lookup.game_ids}"
+            },
+            "extract": {
+                "fields": {
                     "stats": "$.allPlays[*].matchup",
                     "info": "$.allPlays[*].result",
                     "scores": "$.allPlays[?(@.about.isScoringPlay==true)].result"
-                }}
-            }},
+                }
+            },
             "depends_on": ["schedule_lookup"]
-        }},
-        {{
+        },
+        {
             "id": "game_boxscore",
             "type": "function",
             "name": "game_boxscore",
             "description": "Get game statistics and boxscore",
-            "parameters": {{
-                "value": "gamePk=${{schedule_lookup.game_ids}}&fields=teams,pitchers,batters"
-            }},
-            "extract": {{
-                "fields": {{
+            "parameters": {
+                "value": "gamePk=${schedule_lookup.game_ids}&fields=teams,pitchers,batters"
+            },
+            "extract": {
+                "fields": {
                     "stats": "$.teams[*].players[*].stats",
                     "info": "$.info",
                     "scores": "$.teams[*].runs"
-                }}
-            }},
+                }
+            },
             "depends_on": ["schedule_lookup"]
-        }}
+        }
     ],
-    "dependencies": {{
+    "dependencies": {
         "game_playbyplay": ["schedule_lookup"],
         "game_boxscore": ["schedule_lookup"]
-    }}
-}}
+    }
+}
 
 4. League Standings and Statistics:
-{{
+{
     "steps": [
-        {{
+        {
             "id": "standings",
             "type": "function",
             "name": "standings",
             "description": "Get current league standings",
-            "parameters": {{
+            "parameters": {
                 "value": "leagueId=103,104&season=2024"
-            }},
-            "extract": {{
-                "fields": {{
+            },
+            "extract": {
+                "fields": {
                     "stats": "$.records[*].teamRecords[*]",
                     "team_ids": "$.records[*].teamRecords[*].team.id",
                     "info": "$.records[*].division"
-                }}
-            }},
+                }
+            },
             "depends_on": []
-        }},
-        {{
+        },
+        {
             "id": "league_leaders",
             "type": "function",
             "name": "league_leader_data",
             "description": "Get league statistical leaders",
-            "parameters": {{
+            "parameters": {
                 "value": "leaderCategories=homeRuns,battingAverage,era,strikeouts&season=2024"
-            }},
-            "extract": {{
-                "fields": {{
+            },
+            "extract": {
+                "fields": {
                     "player_ids": "$.leagueLeaders[*].person.id",
                     "names": "$.leagueLeaders[*].person.fullName",
                     "stats": "$.leagueLeaders[*]",
                     "team_ids": "$.leagueLeaders[*].team.id"
-                }}
-            }},
+                }
+            },
             "depends_on": []
-        }},
-        {{
+        },
+        {
             "id": "division_stats",
             "type": "function",
             "name": "division_stats",
             "description": "Get division-level statistics",
-            "parameters": {{
-                "value": "divisionId=${{standings.info[0].id}}&season=2024"
-            }},
-            "extract": {{
-                "fields": {{
+            "parameters": {
+                "value": "divisionId=${standings.info[0].id}&season=2024"
+            },
+            "extract": {
+                "fields": {
                     "stats": "$.teams[*].stats[*]",
                     "info": "$.division"
-                }}
-            }},
+                }
+            },
             "depends_on": ["standings"]
-        }}
+        }
     ],
-    "dependencies": {{
+    "dependencies": {
         "division_stats": ["standings"]
-    }}
-}}
+    }
+}
 
 5. Player Comparison Analysis:
-{{
+{
     "steps": [
-        {{
+        {
             "id": "players_lookup",
             "type": "function",
             "name": "lookup_player",
             "description": "Get player IDs and basic info",
-            "parameters": {{
+            "parameters": {
                 "value": "names=Ohtani,Judge,Trout"
-            }},
-            "extract": {{
-                "fields": {{
+            },
+            "extract": {
+                "fields": {
                     "player_ids": "$.players[*].id",
                     "names": "$.players[*].fullName",
                     "team_ids": "$.players[*].currentTeam.id"
-                }}
-            }},
+                }
+            },
             "depends_on": []
-        }},
-        {{
+        },
+        {
             "id": "comparison_stats",
             "type": "function",
             "name": "player_stat_data",
             "description": "Get detailed statistics for comparison",
-            "parameters": {{
-                "value": "personIds=${{players_lookup.player_ids}}&group=hitting&type=season"
-            }},
-            "extract": {{
-                "fields": {{
+            "parameters": {
+                "value": "personIds=${players_lookup.player_ids}&group=hitting&type=season"
+            },
+            "extract": {
+                "fields": {
                     "stats": "$.stats[*].splits[*]",
                     "info": "$.stats[*].group"
-                }}
-            }},
+                }
+            },
             "depends_on": ["players_lookup"]
-        }},
-        {{
+        },
+        {
             "id": "stat_percentiles",
             "type": "function",
             "name": "player_percentiles",
             "description": "Get statistical percentiles for context",
-            "parameters": {{
-                "value": "personIds=${{players_lookup.player_ids}}&stats=batting_exit_velocity,batting_average,ops"
-            }},
-            "extract": {{
-                "fields": {{
+            "parameters": {
+                "value": "personIds=${players_lookup.player_ids}&stats=batting_exit_velocity,batting_average,ops"
+            },
+            "extract": {
+                "fields": {
                     "stats": "$.stats[*].percentiles",
                     "info": "$.stats[*].group"
-                }}
-            }},
+                }
+            },
             "depends_on": ["players_lookup", "comparison_stats"]
-        }}
+        }
     ],
-    "dependencies": {{
+    "dependencies": {
         "stat_percentiles": ["players_lookup", "comparison_stats"]
-    }}
-}}
+    }
+}
 
 Return a complete plan following this schema with appropriate data flows and dependencies:
-{{
+{
     'steps': [
-        {{
+        {
             'id': 'step_id',
             'type': 'function',  # Must always be either 'function' or 'endpoint'
             'name': 'function_name', # From available functions/endpoints
             'description': 'what this step does',
-            'parameters': {{
-                'value': 'parameter string that can reference prior results with ${{step.field}}'
-            }},
-            'extract': {{
-                'fields': {{
+            'parameters': {
+                'value': 'parameter string that can reference prior results with ${step.field}'
+            },
+            'extract': {
+                'fields': {
                     'player_ids': 'jsonpath for player ids',
                     'names': 'jsonpath for names',
                     'stats': 'jsonpath for statistics',
@@ -483,37 +1141,37 @@ Return a complete plan following this schema with appropriate data flows and dep
                     'game_ids': 'jsonpath for game ids',
                     'dates': 'jsonpath for dates',
                     'scores': 'jsonpath for scores'
-                }}
-            }},
+                }
+            },
             'depends_on': ['list of step ids that must complete first']
-        }}
+        }
     ],
-    'fallback': {{
+    'fallback': {
         'enabled': true,
         'strategy': 'fallback approach name',
         'steps': [
-            {{
+            {
                 'id': 'fallback_step_id',
                 'type': 'function',
                 'name': 'fallback_function_name',
-                'parameters': {{
+                'parameters': {
                     'value': 'parameter string'
-                }},
-                'extract': {{
-                    'fields': {{
+                },
+                'extract': {
+                    'fields': {
                         'info': 'jsonpath for basic info',
                         'stats': 'jsonpath for basic stats'
-                    }}
-                }},
+                    }
+                },
                 'depends_on': []
-            }}
+            }
         ]
-    }},
-    'dependencies': {{
+    },
+    'dependencies': {
         'step2': ['step1'],
         'step3': ['step1', 'step2']
-    }}
-}}
+    }
+}
 
 SCHEMA VALIDATION REQUIREMENTS:
 
@@ -528,7 +1186,7 @@ SCHEMA VALIDATION REQUIREMENTS:
 - Should be descriptive of the step's purpose
 
 3. Parameters
-- Must use proper reference syntax: ${{step_id.field}}
+- Must use proper reference syntax: ${step_id.field}
 - All referenced steps must exist
 - All referenced fields must be defined in the extract.fields of the referenced step
 
@@ -572,6 +1230,29 @@ Make sure the returned plan:
 10. Provides appropriate fallback options
 
 Return the complete plan as a single valid JSON object strictly following this schema."""
+        self.plan_prompt = f"""Create an optimized MLB data retrieval plan that leverages data flow relationships.
+
+Available Resources:
+Functions: {self._functions_json_str}
+Endpoints: {self._endpoints_json_str}
+
+{plan_guide}"""
+
+        # Intent analysis and planning in one call, with the catalogs sent once
+        self.combined_prompt = f"""Available MLB Stats API Functions:
+{self._functions_json_str}
+
+Available Endpoints:
+{self._endpoints_json_str}
+
+Return one JSON object with two fields for the baseball query below.
+
+"intent": {intent_guide}
+
+"plan": Create an optimized MLB data retrieval plan for the query that leverages data flow relationships, using the functions and endpoints above.
+If the query is not MLB related or needs no data, return a plan with no steps.
+
+{plan_guide}"""
 
         self.response_prompt = """You create natural, informative responses from MLB data.
             Return structured response with summary, details, and optional stats and media.
@@ -594,278 +1275,591 @@ Return the complete plan as a single valid JSON object strictly following this s
             Query: "What's the weather like?"
             Response: "While I can't check the weather, I can tell you it's always a perfect day for baseball! Would you like to know which games are scheduled today?" """
 
-    async def analyze_intent(self, query: str) -> IntentAnalysis:
+        # Media and chart prompts get their static catalogs baked in once;
+        # only the per-request fields are left as placeholders
+        self.media_prompt = """Based on this MLB context, generate a complete media plan with ready-to-use URLs and detailed, specific search parameters that capture the distinctive aspects of each home run.
+
+        Intent: {intent}
+        Data: {data}
+        Sample Homerun Data: {homerun_sample}
+        Available Media Sources: {media_sources}
+        User Query: {user_query}
+
+        Return a JSON object with:
+        1. direct_media: Array of ready-to-use media items with:
+        - type: "image" or "video"
+        - url: Complete URL (use templates below)
+        - description: Natural description
+        - metadata: Additional info (esp. for homeruns)
+
+        2. homerun_search: Object containing:
+        - keywords: Array of specific, distinctive search terms
+        - stats_criteria: Object with:
+            - min_exit_velocity: Optional minimum exit velocity
+            - max_exit_velocity: Optional maximum exit velocity
+            - min_launch_angle: Optional minimum launch angle
+            - max_launch_angle: Optional maximum launch angle
+            - min_distance: Optional minimum distance
+            - max_distance: Optional maximum distance
+        - player_names: Array containing batter names and mentioned players
+
+        URL Templates:
+        - Player headshots: https://img.mlbstatic.com/mlb-photos/image/upload/d_people:generic:headshot:67:current.png/w_213,q_auto:best/v1/people/[player_id]/headshot/67/current
+        - Team logos: https://www.mlbstatic.com/team-logos/[team_id].svg""".format(
+            intent="{intent}",
+            data="{data}",
+            user_query="{user_query}",
+            homerun_sample=_escape_braces(self._sample_homerun_json_str),
+            media_sources=_escape_braces(self._media_source_json_str),
+        )
+
+        self.chart_prompt = """
+    Analyze this MLB data and determine if it can be visualized as a chart.
+
+    Data:
+    {data}
+
+    Available Chart Types:
+    {chart_specs}
+
+    Return a JSON object with:
+    1. requires_chart (boolean): Whether data should be displayed as a chart
+    2. chart_type (string): One of: "area", "bar", "pie", "radar", "radial" (if requires_chart is true)
+    3. variant (string): Specific variant of the chart type (if requires_chart is true)
+    4. formatted_data (array): Data formatted according to chart schema (if requires_chart is true)
+    5. title (string): Chart title (if requires_chart is true)
+    6. description (string): Brief description of what the chart shows (if requires_chart is true)
+
+    Focus on:
+    - Only suggest chart if data structure matches a chart type schema
+    - Choose most appropriate chart type for data visualization
+    - Format data to match exact schema requirements
+    - Return null for chart-specific fields if requires_chart is false
+    """.format(
+            data="{data}",
+            chart_specs=_escape_braces(self._charts_docs_json_str),
+        )
+
+    async def analyze_intent(
+        self, query: str, context: Optional[Dict[str, Any]] = None
+    ) -> IntentAnalysis:
         """Enhanced intent analysis with structured schema"""
         try:
-            result = await self.gemini.generate_with_fallback(
-                f"{self.intent_prompt}\n{query}",
-                generation_config=genai.GenerationConfig(
-                    response_mime_type="application/json",
-                    response_schema=IntentAnalysis,
-                ),
-                model_name="gemini-1.5-flash",
-            )
+            # L1 exact hit on (query, context), then L2 semantic search off-loop
+            cached = self.intent_cache.get_exact(query, context)
+            if cached is None:
+                cached = await asyncio.to_thread(
+                    self.intent_cache.get_similar, query, context
+                )
+            if cached is not None:
+                return copy.deepcopy(cached)
 
-            parsed_result = json.loads(result.text)
-            print(parsed_result)
-            # Convert enum strings to enum values
-            parsed_result["intent"]["type"] = IntentType(
-                parsed_result["intent"]["type"]
-            )
-            parsed_result["intent"]["specificity"] = Specificity(
-                parsed_result["intent"]["specificity"]
-            )
-            parsed_result["intent"]["timeframe"] = Timeframe(
-                parsed_result["intent"]["timeframe"]
-            )
-            parsed_result["intent"]["complexity"] = Complexity(
-                parsed_result["intent"]["complexity"]
-            )
+            # Concurrent misses are coalesced into a single Gemini call
+            parsed_result = await self.intent_batcher.submit((query, context))
+            logger.opt(lazy=True).debug("Intent analysis: {}", lambda: parsed_result)
 
-            parsed_result["context"]["time_frame"] = Timeframe(
-                parsed_result["context"]["time_frame"]
-            )
-            parsed_result["context"]["comparison_type"] = ComparisonType(
-                parsed_result["context"]["comparison_type"]
-            )
-            parsed_result["context"]["stat_focus"] = StatFocus(
-                parsed_result["context"]["stat_focus"]
+            await asyncio.to_thread(
+                self.intent_cache.put, query, copy.deepcopy(parsed_result), context
             )
-            parsed_result["context"]["sentiment"] = Sentiment(
-                parsed_result["context"]["sentiment"]
-            )
-
-            # Validate and clean entities
-            entities = parsed_result.get("entities", {})
-            for key in entities:
-                if not isinstance(entities[key], list):
-                    entities[key] = [entities[key]] if entities[key] else []
-
             return parsed_result
 
         except Exception as e:
-            print(f"Error in analyze_intent: {str(e)}")
+            logger.exception(f"analyze_intent failed: {e}")
             # Return default fallback intent
-            return {
-                "mlb_query": False,
-                "intent": {
-                    "type": IntentType.CONVERSATION,
-                    "description": "General conversation",
-                    "specificity": Specificity.GENERAL,
-                    "timeframe": Timeframe.CURRENT,
-                    "complexity": Complexity.SIMPLE,
-                },
-                "entities": {
-                    "teams": [],
-                    "players": [],
-                    "dates": [],
-                    "stats": [],
-                    "locations": [],
-                    "events": [],
-                },
-                "context": {
-                    "time_frame": Timeframe.CURRENT,
-                    "comparison_type": ComparisonType.NONE,
-                    "stat_focus": StatFocus.NONE,
-                    "sentiment": Sentiment.NEUTRAL,
-                    "requires_data": False,
-                    "follow_up": False,
-                    "data_requirements": [],
-                },
-            }
+            return copy.deepcopy(_DEFAULT_INTENT)
 
-    def _create_error_response(self, message: str, error: str) -> MLBResponse:
-        """Create a graceful error response"""
-        return {
-            "message": "I encountered an issue processing your request.",
-            "conversation": "I apologize, but I ran into a technical issue. Could you try rephrasing your question?",
-            "data_type": "error",
-            "data": {"error": error},
-            "context": {},
-            "suggestions": [
-                "Try asking about today's games",
-                "Look up a specific player",
-                "Check team standings",
-            ],
-            "media": None,
-        }
+    async def analyze_and_plan(
+        self,
+        query: str,
+        context: Optional[Dict[str, Any]] = None,
+        deps: Optional[MLBDeps] = None,
+    ) -> IntentAnalysis:
+        """
+        Analyze the query and draft its data plan in a single Gemini call. The
+        plan is stored in plan_cache, where create_data_plan picks it up; with
+        deps, its root steps start while the rest is still streaming.
+        """
+        cached = self.intent_cache.get_exact(query, context)
+        if cached is None:
+            cached = await asyncio.to_thread(
+                self.intent_cache.get_similar, query, context
+            )
+        if cached is not None:
+            return copy.deepcopy(cached)
 
-    async def create_data_plan(self, intent: IntentAnalysis) -> DataRetrievalPlan:
-        """Generate structured data retrieval plan with improved schema validation"""
         try:
-            # Compile available resources
-            available_endpoints = list(self.endpoints.keys())
-            available_functions = [f["name"] for f in self.functions]
+            prompt = (
+                f"{self.combined_prompt}\n"
+                f"Current Date: {datetime.now().isoformat()}\n"
+                f"History of messages: {_dumps(context or {})}\n"
+                f"Query to analyze: {query}"
+            )
+            text = await self._generate_plan_streamed(
+                deps,
+                prompt,
+                generation_config=genai.GenerationConfig(
+                    temperature=0.2,
+                    response_mime_type="application/json",
+                    response_schema=_COMBINED_RESPONSE_SCHEMA,
+                ),
+                # The plan half needs the planning model; INTENT_MODEL only
+                # serves the standalone intent fallback
+                model_name="gemini-2.0-flash-exp",
+            )
+            try:
+                parsed = _COMBINED_DECODER.decode(text)
+            except msgspec.ValidationError:
+                # Off-schema intent: parse untyped and coerce by hand
+                parsed = orjson.loads(text)
+                parsed["intent"] = self._coerce_intent(parsed["intent"])
+            intent = parsed["intent"]
+        except Exception as e:
+            logger.exception(f"analyze_and_plan failed: {e}")
+            # Fall back to the separate intent call; planning happens later
+            return await self.analyze_intent(query, context)
 
-            # Define valid types and methods statically
-            valid_types = {"function": True, "endpoint": True}
+        logger.opt(lazy=True).debug("Intent analysis: {}", lambda: intent)
+        await asyncio.to_thread(
+            self.intent_cache.put, query, copy.deepcopy(intent), context
+        )
 
-            valid_methods = {method: True for method in available_endpoints}
-            valid_methods.update({method: True for method in available_functions})
+        plan = parsed.get("plan") or {}
+        if plan.get("steps"):
+            try:
+                plan["steps"] = self._validate_plan_dag(plan)
+                for step in plan["steps"]:
+                    self._compile_extract_fields(step.get("extract"))
+                self.plan_cache.put(self._plan_signature(intent), plan)
+            except Exception as e:
+                # create_data_plan will ask for a plan on its own
+                logger.warning(f"Discarding combined plan: {e}")
+        return intent
 
-            # Define response schema
-            response_schema = {
-                "type": "object",
-                "properties": {
-                    "steps": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "id": {"type": "string"},
-                                "type": {"type": "string"},
-                                "name": {"type": "string"},
-                                "description": {"type": "string"},
-                                "parameters": {
-                                    "type": "object",
-                                    "properties": {
-                                        "source_step": {"type": "string"},
-                                        "source_path": {"type": "string"},
-                                        "filter": {"type": "string"},
-                                        "value": {"type": "string"},
-                                    },
-                                },
-                                "extract": {
-                                    "type": "object",
-                                    "properties": {
-                                        "fields": {
-                                            "type": "object",
-                                            "properties": {
-                                                "player_ids": {"type": "string"},
-                                                "names": {"type": "string"},
-                                                "stats": {"type": "string"},
-                                                "info": {"type": "string"},
-                                                "team_ids": {"type": "string"},
-                                                "game_ids": {"type": "string"},
-                                                "dates": {"type": "string"},
-                                                "scores": {"type": "string"},
-                                            },
-                                        },
-                                        "filter": {"type": "string"},
-                                    },
-                                    "required": ["fields"],
-                                },
-                                "depends_on": {
-                                    "type": "array",
-                                    "items": {"type": "string"},
-                                },
-                                "required_for": {
-                                    "type": "array",
-                                    "items": {"type": "string"},
-                                },
-                            },
-                            "required": [
-                                "id",
-                                "type",
-                                "name",
-                                "description",
-                                "parameters",
-                                "extract",
-                                "depends_on",
-                            ],
-                        },
-                    },
-                    "dependencies": {
-                        "type": "object",
-                        "properties": {
-                            "step1": {"type": "array", "items": {"type": "string"}},
-                            "step2": {"type": "array", "items": {"type": "string"}},
-                        },
-                    },
-                },
-                "required": ["steps", "dependencies"],
-            }
+    async def _analyze_intent_batch(
+        self, requests: List[Tuple[str, Optional[Dict[str, Any]]]]
+    ) -> List[Dict[str, Any]]:
+        """Analyze one or more (query, context) pairs with a single Gemini call"""
+        # Static prefix first, per-request date/history/query last
+        current_date = f"Current Date: {datetime.now().isoformat()}"
+
+        if len(requests) == 1:
+            query, context = requests[0]
+            history = _dumps(context or {})
+            prompt = (
+                f"{self.intent_prompt}\n"
+                f"{current_date}\n"
+                f"History of messages: {history}\n"
+                f"Query to analyze: {query}"
+            )
+            response_schema = IntentAnalysis
+        else:
+            queries = "\n\n".join(
+                f"Query {i}:\n"
+                f"History of messages: {_dumps(context or {})}\n"
+                f"Query to analyze: {query}"
+                for i, (query, context) in enumerate(requests, start=1)
+            )
+            prompt = (
+                f"{self.intent_prompt}\n"
+                f"{current_date}\n"
+                f"Analyze each of the following {len(requests)} queries independently. "
+                f"Return a JSON array with one item per query, setting each item's "
+                f"index to the query's number and its analysis to the result.\n\n"
+                f"{queries}"
+            )
+            response_schema = _INTENT_BATCH_RESPONSE_SCHEMA
+
+        generation_config = genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
+        )
+        result = await self.gemini.generate_with_fallback(
+            prompt,
+            generation_config=generation_config,
+            model_name=settings.INTENT_MODEL,
+        )
+        try:
+            return self._decode_intents(result.text, len(requests))
+        except msgspec.DecodeError:
+            if settings.INTENT_MODEL == _INTENT_ESCALATION_MODEL:
+                raise
+            # Malformed JSON from the small model: retry once on the larger one
+            logger.warning(
+                f"{settings.INTENT_MODEL} returned invalid JSON, "
+                f"retrying with {_INTENT_ESCALATION_MODEL}"
+            )
+
+        result = await self.gemini.generate_with_fallback(
+            prompt,
+            generation_config=generation_config,
+            model_name=_INTENT_ESCALATION_MODEL,
+        )
+        return self._decode_intents(result.text, len(requests))
+
+    def _decode_intents(self, text: str, count: int) -> List[Dict[str, Any]]:
+        """Decode one or a batch of intent analyses into a list in query order"""
+        if count == 1:
+            try:
+                return [_INTENT_DECODER.decode(text)]
+            except msgspec.ValidationError:
+                # Off-schema output (unknown enum value, scalar entity): coerce by hand
+                return [self._coerce_intent(orjson.loads(text))]
+
+        try:
+            items = _INTENT_BATCH_DECODER.decode(text)
+        except msgspec.ValidationError:
+            items = [
+                {
+                    "index": item["index"],
+                    "analysis": self._coerce_intent(item["analysis"]),
+                }
+                for item in orjson.loads(text)
+            ]
+
+        # Raising hands the batch back to the batcher, which retries each query alone
+        by_index: Dict[int, Dict[str, Any]] = {}
+        for item in items:
+            if item["index"] in by_index:
+                raise ValueError(f"Duplicate intent index {item['index']}")
+            by_index[item["index"]] = item["analysis"]
+        if by_index.keys() != set(range(1, count + 1)):
+            raise ValueError(
+                f"Expected intent indexes 1..{count}, got {sorted(by_index)}"
+            )
+        return [by_index[i] for i in range(1, count + 1)]
+
+    def _coerce_intent(self, parsed_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Repair an intent analysis that failed typed decoding"""
+        # Convert enum strings to enum values, unknown values get the default
+        for section, key, enum_cls, default in self._ENUM_FIELDS:
+            fields = parsed_result[section]
+            fields[key] = enum_cls._value2member_map_.get(fields.get(key), default)
+
+        # Validate and clean entities
+        entities = parsed_result.get("entities", {})
+        for key in entities:
+            if not isinstance(entities[key], list):
+                entities[key] = [entities[key]] if entities[key] else []
+
+        return parsed_result
+
+    def _create_error_response(self, message: str, error: str) -> MLBResponse:
+        """Create a graceful error response"""
+        return {**_ERROR_RESPONSE, "data": {"error": error}, "context": {}}
+
+    async def create_data_plan(
+        self, intent: IntentAnalysis, deps: Optional[MLBDeps] = None
+    ) -> DataRetrievalPlan:
+        """Generate structured data retrieval plan with improved schema validation"""
+        intent_key = self._plan_signature(intent)
+        cached_plan = self.plan_cache.get_exact(intent_key)
+        if cached_plan is not None:
+            return copy.deepcopy(cached_plan)
+
+        try:
             # Generate plan using LLM
-            result = await self.gemini.generate_with_fallback(
-                f"""{self.plan_prompt}\nCurrent Intent:\n{json.dumps(self.intent, indent=2)}""",
+            text = await self._generate_plan_streamed(
+                deps,
+                f"{self.plan_prompt}\nCurrent Intent:\n{_dumps(intent)}",
                 generation_config=genai.GenerationConfig(
                     temperature=0.2,
                     response_mime_type="application/json",
-                    response_schema=response_schema,
+                    response_schema=_PLAN_RESPONSE_SCHEMA,
                 ),
                 model_name="gemini-2.0-flash-exp",
             )
-            parsed_result = json.loads(result.text)
-            print(parsed_result)
+            parsed_result = orjson.loads(text)
+            logger.opt(lazy=True).debug("Data plan: {}", lambda: parsed_result)
 
-            # Process steps
+            parsed_result["steps"] = self._validate_plan_dag(parsed_result)
+            # Compile extraction paths now so execution only applies them
             for step in parsed_result["steps"]:
-                if step["type"] not in valid_types:
-                    raise ValueError(f"Invalid step type: {step['type']}")
-                if step["name"] not in valid_methods:
-                    raise ValueError(f"Invalid step name: {step['name']}")
-
-            # Validate dependencies
-            step_ids = {step["id"]: True for step in parsed_result["steps"]}
-            for step_deps in parsed_result["dependencies"].values():
-                for dep_id in step_deps:
-                    if dep_id not in step_ids:
-                        raise ValueError(f"Invalid dependency ID: {dep_id}")
+                self._compile_extract_fields(step.get("extract"))
 
+            self.plan_cache.put(intent_key, copy.deepcopy(parsed_result))
             return parsed_result
 
         except Exception as e:
-            print(f"Error in create_data_plan: {str(e)}")
+            logger.exception(f"create_data_plan failed: {e}")
             # Return simplified fallback plan
             return self._create_fallback_plan(intent)
 
-    def _create_fallback_plan(self, intent: IntentAnalysis) -> DataRetrievalPlan:
-        """Create a simplified fallback plan when main plan creation fails"""
+    async def _generate_plan_streamed(
+        self,
+        deps: Optional[MLBDeps],
+        prompt: str,
+        generation_config: Any,
+        model_name: str,
+    ) -> str:
+        """Stream a plan response, starting each root step once it is complete"""
+        scanner = _StepScanner()
+        chunks = []
+        try:
+            async for chunk in self.gemini.stream_with_fallback(
+                prompt, generation_config=generation_config, model_name=model_name
+            ):
+                chunks.append(chunk)
+                if deps is not None:
+                    for step in scanner.feed(chunk):
+                        self._start_step_early(deps, step)
+        except Exception as e:
+            if not self.gemini.is_rate_limit_error(e):
+                raise
+            # Rate limited mid-stream: redo the plan on the retrying call; steps
+            # already started are adopted if the new plan has the same step
+            logger.warning(f"Plan stream rate limited, regenerating: {e}")
+            result = await self.gemini.generate_with_fallback(
+                prompt, generation_config=generation_config, model_name=model_name
+            )
+            return result.text
+        return "".join(chunks)
+
+    def _start_step_early(self, deps: MLBDeps, step: Any) -> None:
+        """Run a streamed step ahead of the plan if it needs no prior results"""
+        if (
+            not isinstance(step, dict)
+            or not step.get("id")
+            or step["id"] in deps.started_steps
+            or step.get("depends_on")
+            or (step.get("parameters") or {}).get("source_step")
+            or any(_parameter_references(step.get("parameters")))
+            or step.get("type") not in self._valid_types
+            or step.get("name") not in self._valid_methods
+        ):
+            return
+        deps.started_steps[step["id"]] = (
+            self._step_key(step),
+            asyncio.ensure_future(self._run_plan_step(deps, copy.deepcopy(step), {})),
+        )
 
-        # Basic fallback plan structure
-        return {
-            "steps": [
-                {
-                    "id": "basic_data",
-                    "type": "function",
-                    "name": "standings"
-                    if intent["intent"]["type"] == "standings"
-                    else "schedule",
-                    "description": "Get basic MLB data",
-                    "parameters": {
-                        "value": "leagueId=103,104"
-                        if intent["intent"]["type"] == "standings"
-                        else "sportId=1"
-                    },
-                    "extract": {
-                        "fields": {
-                            "stats": "$.records[*].teamRecords[*]"
-                            if intent["intent"]["type"] == "standings"
-                            else "$.dates[*].games[*]",
-                            "info": "$.records[*].division"
-                            if intent["intent"]["type"] == "standings"
-                            else "$.dates[*].date",
-                        }
-                    },
-                    "depends_on": [],
-                }
-            ],
-            "dependencies": {},
+    @staticmethod
+    def _step_key(step: Dict[str, Any]) -> bytes:
+        """The fields that decide what a step fetches and extracts"""
+        return orjson.dumps(
+            [step.get(key) for key in ("type", "name", "parameters", "extract")],
+            option=orjson.OPT_SORT_KEYS,
+            default=str,
+        )
+
+    @staticmethod
+    def _plan_signature(intent: IntentAnalysis) -> str:
+        """Canonical key over the intent fields that shape a data plan"""
+        details = intent.get("intent", {})
+        context = intent.get("context", {})
+        # Free-text descriptions and sentiment vary between phrasings of the same
+        # request without changing which data has to be fetched
+        shape = {
+            "type": details.get("type"),
+            "specificity": details.get("specificity"),
+            "timeframe": details.get("timeframe"),
+            "time_frame": context.get("time_frame"),
+            "comparison_type": context.get("comparison_type"),
+            "stat_focus": context.get("stat_focus"),
+            "entities": {
+                key: sorted(map(str, values))
+                for key, values in intent.get("entities", {}).items()
+            },
+            # Plans embed concrete dates and seasons from the prompt's current
+            # date, so a plan is only reused on the day it was made
+            "date": datetime.now().date().isoformat(),
         }
+        return hashlib.blake2b(
+            orjson.dumps(shape, option=orjson.OPT_SORT_KEYS), digest_size=16
+        ).hexdigest()
+
+    def _validate_plan_dag(self, plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Validate plan steps and dependencies, returning steps in topological order"""
+        steps = plan["steps"]
+        index = {}
+        for i, step in enumerate(steps):
+            if step["type"] not in self._valid_types:
+                raise ValueError(f"Invalid step type: {step['type']}")
+            if step["name"] not in self._valid_methods:
+                raise ValueError(f"Invalid step name: {step['name']}")
+            index[step["id"]] = i
+
+        # Edges come from each step's depends_on, the top-level dependencies map
+        # and the steps its parameters reference
+        parents: List[set] = [set(step.get("depends_on") or ()) for step in steps]
+        for step_id, step_deps in plan["dependencies"].items():
+            if step_id in index:
+                parents[index[step_id]].update(step_deps)
+        for i, step in enumerate(steps):
+            undeclared = _referenced_step_ids(step, index) - parents[i]
+            if undeclared:
+                # Declared so execution waits for them and passes their results
+                step["depends_on"] = [
+                    *(step.get("depends_on") or ()),
+                    *sorted(undeclared),
+                ]
+                parents[i].update(undeclared)
+
+        children: List[List[int]] = [[] for _ in steps]
+        in_degree = [0] * len(steps)
+        for i, step_parents in enumerate(parents):
+            for dep_id in step_parents:
+                if dep_id not in index:
+                    raise ValueError(f"Invalid dependency ID: {dep_id}")
+                children[index[dep_id]].append(i)
+                in_degree[i] += 1
+
+        # Kahn's algorithm; steps never released are part of a cycle
+        ready = deque(i for i, degree in enumerate(in_degree) if degree == 0)
+        order = []
+        while ready:
+            i = ready.popleft()
+            order.append(i)
+            for child in children[i]:
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    ready.append(child)
+
+        if len(order) != len(steps):
+            cyclic = [steps[i]["id"] for i, degree in enumerate(in_degree) if degree]
+            raise ValueError(f"Circular dependency between steps: {cyclic}")
+
+        for i, step in enumerate(steps):
+            step["required_for"] = [steps[child]["id"] for child in children[i]]
+        return [steps[i] for i in order]
+
+    @staticmethod
+    def _compile_extract_fields(extract: Any) -> Optional[Dict[str, JSONPath]]:
+        """Compiled JSONPath per extract field, or None if any path is unusable"""
+        if not isinstance(extract, dict) or not isinstance(extract.get("fields"), dict):
+            return None
+        compiled = {}
+        for field, expression in extract["fields"].items():
+            if not expression:
+                continue
+            if not isinstance(expression, str) or not expression.startswith("$"):
+                return None
+            try:
+                compiled[field] = _compile_jsonpath(expression)
+            except Exception:
+                return None
+        return compiled or None
+
+    def _create_fallback_plan(self, intent: IntentAnalysis) -> DataRetrievalPlan:
+        """Create a simplified fallback plan when main plan creation fails"""
+        if intent["intent"]["type"] == "standings":
+            return copy.deepcopy(_STANDINGS_FALLBACK_PLAN)
+        return copy.deepcopy(_SCHEDULE_FALLBACK_PLAN)
 
     async def execute_plan(
         self, deps: MLBDeps, plan: DataRetrievalPlan
     ) -> Dict[str, Any]:
         """Execute the retrieval plan with data filtering and extraction"""
         results = {}
+        dependencies = plan.get("dependencies") or {}
+        waiting = {step["id"]: step for step in plan["steps"]}
+        # Unfinished dependency count per step, and who waits on each id, so a
+        # completion only touches its own dependents
+        remaining = {}
+        dependents = defaultdict(list)
+        for step_id, step in waiting.items():
+            needs = self._step_dependencies(step, dependencies)
+            remaining[step_id] = len(needs)
+            for dep_id in needs:
+                dependents[dep_id].append(step_id)
+        ready = [step for step_id, step in waiting.items() if not remaining[step_id]]
+        running: Dict[asyncio.Future, Dict[str, Any]] = {}
+
+        # Each step starts as soon as its own dependencies have finished, so its
+        # parameter resolution and code generation overlap unrelated slow steps
+        try:
+            while waiting or running:
+                if not ready and not running:
+                    # Unresolvable ids: run what is left
+                    ready = list(waiting.values())
+                for step in ready:
+                    del waiting[step["id"]]
+                    task = self._adopt_started_step(
+                        deps, step, dependencies
+                    ) or asyncio.ensure_future(
+                        self._run_plan_step(
+                            deps,
+                            step,
+                            self._referenced_results(step, results, dependencies),
+                        )
+                    )
+                    running[task] = step
+                ready = []
 
-        for step in plan["steps"]:
-            # Execute current step
-            print(step)
-            raw_result = await self._execute_step(deps, step, results)
-            if not raw_result:
-                continue
-
-            # Apply extraction if specified
-            if "extract" in step:
-                filtered_result = await self._process_extraction(
-                    raw_result, step["extract"]
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
                 )
-                results[step["id"]] = filtered_result
-            else:
-                results[step["id"]] = raw_result
+                for task in done:
+                    step = running.pop(task)
+                    for child_id in dependents.pop(step["id"], ()):
+                        remaining[child_id] -= 1
+                        if not remaining[child_id] and child_id in waiting:
+                            ready.append(waiting[child_id])
+                    if task.cancelled():
+                        logger.error(f"Step {step['id']} was cancelled")
+                    elif task.exception() is not None:
+                        logger.error(f"Step {step['id']} failed: {task.exception()}")
+                    elif task.result():
+                        results[step["id"]] = task.result()
+        finally:
+            for task in running:
+                task.cancel()
         return results
 
+    def _adopt_started_step(
+        self, deps: MLBDeps, step: Dict[str, Any], dependencies: Dict[str, Any]
+    ) -> Optional[asyncio.Future]:
+        """The task started for this step while streaming, if it is still valid"""
+        started = deps.started_steps.pop(step["id"], None)
+        if started is None:
+            return None
+        key, task = started
+        # The final plan may have added dependencies after the step streamed
+        if key == self._step_key(step) and not self._step_dependencies(
+            step, dependencies
+        ):
+            return task
+        task.cancel()
+        return None
+
+    def _referenced_results(
+        self,
+        step: Dict[str, Any],
+        results: Dict[str, Any],
+        dependencies: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Results of the steps this one depends on or takes parameters from"""
+        referenced = self._step_dependencies(step, dependencies)
+        source_step = (step.get("parameters") or {}).get("source_step")
+        if source_step:
+            referenced.add(source_step)
+        # Unrelated results would only make the prompts and cache keys vary
+        # with whichever steps happened to finish first
+        return {
+            step_id: results[step_id] for step_id in referenced if step_id in results
+        }
+
+    @staticmethod
+    def _step_dependencies(step: Dict[str, Any], dependencies: Dict[str, Any]) -> set:
+        """Ids a step waits on, from its depends_on and the plan's dependency map"""
+        return set(step.get("depends_on") or ()) | set(
+            dependencies.get(step["id"]) or ()
+        )
+
+    async def _run_plan_step(
+        self, deps: MLBDeps, step: Dict[str, Any], prior_results: Dict[str, Any]
+    ) -> Any:
+        """Execute one plan step and apply its extraction"""
+        async with self._step_slots:
+            raw_result = await self._execute_step(deps, step, prior_results)
+        if not raw_result:
+            return None
+
+        # Endpoint steps extract from the response body themselves; applying
+        # the paths again to their output would match nothing
+        if "extract" in step and step.get("type") != "endpoint":
+            return await self._process_extraction(raw_result, step["extract"])
+        return raw_result
+
     async def _execute_step(
         self, deps: MLBDeps, step: Dict[str, Any], prior_results: Dict[str, Any]
     ) -> Optional[Dict[str, Any]]:
@@ -874,9 +1868,13 @@ Return the complete plan as a single valid JSON object strictly following this s
             # Resolve basic parameters
             method_type = step.get("type", "")
             params = step.get("parameters", {})
-            print(params)
-            print(method_type)
-            print(prior_results)
+            logger.opt(lazy=True).debug(
+                "Executing {} step {} with {} (prior results: {})",
+                lambda: method_type,
+                lambda: step.get("id"),
+                lambda: params,
+                lambda: list(prior_results),
+            )
             # Execute based on method type
             if method_type == "function":
                 result = await self._execute_function_step(deps, step, prior_results)
@@ -885,18 +1883,18 @@ Return the complete plan as a single valid JSON object strictly following this s
                 result = await self._execute_endpoint_step(deps, step, prior_results)
                 return result
             else:
-                print(f"Unknown method type: {method_type}")
+                logger.warning(f"Unknown method type: {method_type}")
                 return None
         except Exception as e:
-            print(f"Error executing step {step.get('stepNumber')}: {str(e)}")
+            logger.error(f"Error executing step {step.get('id')}: {str(e)}")
 
             # Try fallback if specified
             if step.get("fallback"):
                 try:
-                    print(f"Attempting fallback for step {step.get('stepNumber')}")
+                    logger.info(f"Attempting fallback for step {step.get('id')}")
                     return await self._execute_fallback(deps, step, prior_results)
                 except Exception as fallback_error:
-                    print(f"Fallback failed: {str(fallback_error)}")
+                    logger.error(f"Fallback failed: {str(fallback_error)}")
 
             return None
 
@@ -907,26 +1905,35 @@ Return the complete plan as a single valid JSON object strictly following this s
         try:
             # Get function name and info
             function_name = step["name"]
-            function_info = next(
-                (f for f in self.functions if f["name"] == function_name), None
-            )
+            function_info = self._functions_by_name.get(function_name)
             if not function_info:
                 raise ValueError(f"Invalid function: {function_name}")
 
             # Resolve parameters
             resolved_params = await self._resolve_parameters(step, prior_results)
 
+            # Plain literal arguments are dispatched straight to statsapi
+            call_args = _parse_call_arguments(resolved_params.get("value"))
+            if call_args is not None:
+                args, kwargs = call_args
+                try:
+                    return await asyncio.to_thread(
+                        getattr(statsapi, function_name), *args, **kwargs
+                    )
+                except Exception as e:
+                    logger.warning(
+                        f"Direct call statsapi.{function_name} failed, "
+                        f"falling back to generated code: {e}"
+                    )
+
             # Generate execution code using LLM
             execution_code = await self._generate_execution_code(
                 function_name=function_name,
                 function_info=function_info,
                 parameters=resolved_params,
             )
-            sanitized_code = sanitize_code(execution_code)
-            # print("sanitized code:", sanitized_code)
-
-            repl_result = await self.repl(code=sanitized_code)
-            print("repl result:", repl_result)
+            repl_result = await self.repl(code=execution_code)
+            logger.opt(lazy=True).debug("REPL result: {}", lambda: repl_result)
 
             if repl_result.get("status") == "error":
                 raise RuntimeError(
@@ -939,17 +1946,17 @@ Return the complete plan as a single valid JSON object strictly following this s
                 if not output:
                     raise ValueError("No output from function execution")
 
-                result = json.loads(output)
+                result = orjson.loads(output)
                 if isinstance(result, dict) and "error" in result:
                     raise RuntimeError(f"Function error: {result['error']}")
 
                 return result
 
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 raise ValueError(f"Failed to parse function result: {repl_result}")
 
         except Exception as e:
-            print(f"Function execution error: {str(e)}")
+            logger.error(f"Function execution error: {str(e)}")
             return None
 
     async def _generate_execution_code(
@@ -958,12 +1965,15 @@ Return the complete plan as a single valid JSON object strictly following this s
         function_info: Dict[str, Any],
         parameters: Dict[str, Any],
     ) -> str:
-        """Generate Python code to execute MLB stats API calls"""
+        """Generate sanitized Python code to execute MLB stats API calls"""
+        cached_code = self.code_cache.get_exact(function_name, parameters)
+        if cached_code is not None:
+            return cached_code
 
         prompt = f"""Generate code that calls statsapi.{function_name} with these parameters:
-    {json.dumps(parameters.get("value", parameters), indent=2)}
+    {_dumps(parameters.get("value", parameters))}
     Make sure to comply with the function signature (types, number of parameters, etc.).
-    Function documentation: {json.dumps(function_info, indent=2)}
+    Function documentation: {_dumps(function_info)}
 
     Requirements:
     1. Import only statsapi and json
@@ -996,12 +2006,11 @@ Return the complete plan as a single valid JSON object strictly following this s
             model_name="gemini-1.5-pro",
         )
 
-        return (
-            generated_code.text.strip()
-            .replace("```python", "")
-            .replace("```", "")
-            .strip()
-        )
+        code = sanitize_code(strip_code_fences(generated_code.text))
+        # Only code that parses is cached; a bad generation is retried next time
+        compile(code, f"<statsapi.{function_name}>", "exec")
+        await asyncio.to_thread(self.code_cache.put, function_name, code, parameters)
+        return code
 
     async def _execute_endpoint_step(
         self, deps: MLBDeps, step: Dict[str, Any], prior_results: Dict[str, Any]
@@ -1033,14 +2042,15 @@ Return the complete plan as a single valid JSON object strictly following this s
                 raise ValueError("Failed to format URL")
             """
             # Make request
-            print(endpoint_url)
-            response = await deps.client.get(endpoint_url)  # request_info["url"]
-            response.raise_for_status()
-            result = response.json()
+            logger.debug(f"Requesting {endpoint_url}")
+            raw = await self._fetch_content(deps, endpoint_name, endpoint_url)
+            result = orjson.loads(raw)
 
             # Process data extraction if specified
             if step.get("extract"):
-                result = await self._process_extraction(result, step["extract"])
+                result = await self._process_extraction(
+                    result, step["extract"], raw=raw
+                )
 
             """# Apply filtering if specified
             if step.get("filtering") and step["filtering"].lower() != "none":
@@ -1049,24 +2059,69 @@ Return the complete plan as a single valid JSON object strictly following this s
             return result
 
         except Exception as e:
-            print(f"Endpoint execution error: {str(e)}")
+            logger.error(f"Endpoint execution error: {str(e)}")
             return None
 
+    async def _fetch_content(
+        self, deps: MLBDeps, endpoint_name: str, url: str
+    ) -> bytes:
+        """Body of a successful GET, reused within the TTL unless the data is live"""
+        live = endpoint_name in _LIVE_ENDPOINTS
+        raw = None if live else self._http_cache.get(url)
+        if raw is None:
+            response = await deps.client.get(url)
+            response.raise_for_status()
+            raw = response.content
+            if not live:
+                self._http_cache[url] = raw
+        return raw
+
+    @staticmethod
+    def _cancel_started_steps(deps: MLBDeps) -> None:
+        """Cancel early-started steps that the final plan did not use"""
+        for _, task in deps.started_steps.values():
+            task.cancel()
+        deps.started_steps.clear()
+
     async def _process_extraction(
         self,
         data: Any,
         extraction_info: str,
         size_threshold: int = 500_000,  # Default threshold in characters, chosen hazardly
+        raw: Optional[bytes] = None,
     ) -> Any:
-        """Process data extraction based on extraction info and data size"""
-        data_size = (
-            len(json.dumps(data)) if isinstance(data, (dict, list)) else len(str(data))
-        )
-        print("data size", data_size)
+        """
+        Process data extraction based on extraction info and data size. raw is
+        the response body data was parsed from, if any; large payloads are
+        sized, sampled and sent to the REPL from it without re-serializing.
+        """
+        # Valid JSONPath fields are applied directly, and an empty match is a
+        # result like any other; only invalid paths or a free-text filter still
+        # need the LLM, which then sees the extracted fields instead of the
+        # whole payload
+        compiled = self._compile_extract_fields(extraction_info)
+        if compiled and isinstance(data, (dict, list)):
+            extracted = {
+                field: [match.value for match in path.find(data)]
+                for field, path in compiled.items()
+            }
+            filter_info = extraction_info.get("filter")
+            if str(filter_info or "none").lower() == "none":
+                return extracted
+            data, extraction_info = extracted, {"filter": filter_info}
+            raw = None
+
+        if raw is not None and len(raw) > size_threshold:
+            serialized = raw
+        else:
+            # Serialized once: the size decides the branch and the text feeds the prompt
+            serialized = _dumps(data) if isinstance(data, (dict, list)) else str(data)
+        data_size = len(serialized)
+        logger.debug(f"Extraction payload size: {data_size}")
         if data_size <= size_threshold:
             # For small data, use LLM directly
             prompt = f"""Given this data:
-            {json.dumps(data) if isinstance(data, (dict, list)) else str(data)}
+            {serialized}
             
             Extract data given its instruction/schema:
             {extraction_info}
@@ -1081,118 +2136,118 @@ Return the complete plan as a single valid JSON object strictly following this s
                         response_mime_type="text/plain",
                     ),
                 )
-                # print(result)
-                dict_result = (
-                    result.text.strip()
-                    .replace("```json\n", "")
-                    .replace("```", "")
-                    .replace("\n", "")
-                )
-                result = json.loads(dict_result)
-                print("extracted result is: ", result)
+                # JSON tolerates the newlines, so only the fences are removed
+                result = orjson.loads(strip_code_fences(result.text))
+                logger.opt(lazy=True).debug("Extracted result: {}", lambda: result)
                 return result
-            except (json.JSONDecodeError, Exception) as e:
-                print(f"Direct extraction error: {str(e)}")
+            except (orjson.JSONDecodeError, Exception) as e:
+                logger.error(f"Direct extraction error: {str(e)}")
                 return data
         else:
-            # For large data, use REPL approach
-            prompt = f"""Generate Python code to extract data according to this specification:
+            # For large data, use REPL approach; the generated code depends only
+            # on the spec and the payload's layout, so it is reused across calls
+            code_context = {"spec": extraction_info, "shape": _payload_shape(data)}
+            try:
+                extraction_code = self.code_cache.get_exact(
+                    "extract_data", code_context
+                )
+                generated = extraction_code is None
+                if generated:
+                    sample = serialized[:10000]
+                    if isinstance(sample, bytes):
+                        sample = sample.decode(errors="ignore")
+                    prompt = f"""Generate Python code to extract data according to this specification:
             
             Data structure:
-            {json.dumps(data)[:10000] if isinstance(data, (dict, list)) else str(data)[:10000]}
+            {sample}
             
             Extraction needed:
             {extraction_info}
             
             Return a Python function named extract_data that takes the data as input and returns the extracted result.
             """
+                    result = await self.gemini.generate_with_fallback(
+                        prompt,
+                        generation_config=genai.GenerationConfig(
+                            response_mime_type="text/plain"
+                        ),
+                    )
+                    extraction_code = strip_code_fences(result.text)
 
-            try:
-                result = await self.gemini.generate_with_fallback(
-                    prompt,
-                    generation_config=genai.GenerationConfig(
-                        response_mime_type="text/plain"
-                    ),
-                )
-
-                extraction_code = (
-                    result.text.strip().replace("```python", "").replace("```", "")
+                # The data travels with the code to the worker, which calls
+                # extract_data on it; the JSON built for the size check (or the
+                # raw body) is reused rather than encoded again
+                logger.opt(lazy=True).debug(
+                    "Extraction code: {}", lambda: extraction_code
                 )
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    data_file = os.path.join(temp_dir, "data.json")
-                    with open(data_file, "w") as f:
-                        json.dump(data, f)
-
-                    execution_code = f"""
-                {extraction_code}
-
-                try:
-                    with open('{data_file}', 'r') as f:
-                        data = json.load(f)
-                    
-                    result = extract_data(data)
-                    print(json.dumps(result))
-                except Exception as e:
-                    print(json.dumps({{"error": str(e)}}))
-                    """
-                    print("extraction code: ", execution_code)
-                    repl_result = await self.repl(code=execution_code)
-
-                    if repl_result.get("status") == "error":
-                        raise RuntimeError(
-                            f"Extraction failed: {repl_result.get('error')}"
-                        )
-
-                    try:
-                        output = repl_result.get("output")
-                        if not output:
-                            raise ValueError("No output from extraction")
-
-                        result = json.loads(output)
-                        if isinstance(result, dict) and "error" in result:
-                            raise RuntimeError(f"Extraction error: {result['error']}")
+                if isinstance(data, (dict, list)):
+                    repl_result = await self.repl(
+                        code=extraction_code,
+                        json_inputs={"data": serialized},
+                        entry="extract_data",
+                    )
+                else:
+                    repl_result = await self.repl(
+                        code=extraction_code,
+                        inputs={"data": data},
+                        entry="extract_data",
+                    )
 
-                        return result
+                if repl_result.get("status") == "error":
+                    raise RuntimeError(f"Extraction failed: {repl_result.get('error')}")
 
-                    except json.JSONDecodeError:
-                        return data
+                # Decoded once with the worker's frame, however large it is
+                result = repl_result.get("output")
+                if isinstance(result, dict) and "error" in result:
+                    raise RuntimeError(f"Extraction error: {result['error']}")
+
+                # Only code that ran cleanly is kept
+                if generated:
+                    await asyncio.to_thread(
+                        self.code_cache.put,
+                        "extract_data",
+                        extraction_code,
+                        code_context,
+                    )
+                return result
 
             except Exception as e:
-                print(f"Extraction error: {str(e)}")
+                logger.error(f"Extraction error: {str(e)}")
                 return data
 
-    async def _execute_processing_code(
-        self, processing_code: str, data: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """Execute generated processing code using the analysis tool"""
-
-        # Prepare the code to execute
-        execution_code = f"""
-import json
-
-{processing_code}
-
-# Input data
-data = {json.dumps(data)}
-
-# Execute processing function
-result = process_data(data)
-print(json.dumps(result))
-    """
-        print("hihoo", execution_code)
-
-        # Use the analysis tool to execute the code
-        result = await self.repl.execute(execution_code)
-
-        # Parse and return the processed result
-        try:
-            return json.loads(result.output)
-        except json.JSONDecodeError:
-            print(f"Error parsing processing result: {result.output}")
-            return data  # Return original data if processing fails
-
     async def _resolve_parameters(
         self, step: Dict[str, Any], prior_results: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Resolve step parameters; identical resolutions in flight share one call"""
+        # Only the referenced values and a schema go into the prompt when they
+        # suffice, so the prompt and the cache keys stay small as results grow.
+        # Serialized once; the cache keys hash the text
+        prior_json = _dumps(_prior_results_view(step.get("parameters"), prior_results))
+        prior_digest = hashlib.blake2b(prior_json.encode(), digest_size=16).hexdigest()
+        flight_key = cache_key(
+            f"{step.get('type')}:{step.get('name')}",
+            [step.get("parameters"), step.get("description"), prior_digest],
+        )
+        pending = self._params_inflight.get(flight_key)
+        if pending is None:
+            pending = asyncio.ensure_future(
+                self._resolve_parameters_once(
+                    step, prior_results, prior_json, prior_digest
+                )
+            )
+            self._params_inflight[flight_key] = pending
+            pending.add_done_callback(
+                lambda _: self._params_inflight.pop(flight_key, None)
+            )
+        # Shielded so one caller's cancellation does not fail the others
+        return dict(await asyncio.shield(pending))
+
+    async def _resolve_parameters_once(
+        self,
+        step: Dict[str, Any],
+        prior_results: Dict[str, Any],
+        prior_json: str,
+        prior_digest: str,
     ) -> Dict[str, Any]:
         """Resolve API parameters and return complete URL for endpoints"""
         try:
@@ -1201,23 +2256,33 @@ print(json.dumps(result))
             step_name = step.get("name")
             step_description = step.get("description")
 
+            # Resolution depends on the referenced prior values and on the day
+            params_key = f"{step_type}:{step_name}"
+            params_context = {
+                "parameters": step.get("parameters"),
+                "description": step_description,
+                "prior_results": prior_digest,
+                "date": datetime.now().date().isoformat(),
+            }
+            cached_params = self.params_cache.get_exact(params_key, params_context)
+            if cached_params is not None:
+                return dict(cached_params)
+
             if step_type == "function":
-                function_info = next(
-                    (f for f in self.functions if f["name"] == step_name), None
-                )
+                function_info = self._functions_by_name.get(step_name)
                 if not function_info:
                     raise ValueError(f"Invalid function: {step_name}")
 
                 prompt = f"""Format MLB Stats API function parameters.
 
     Function Info:
-    {json.dumps(function_info, indent=2)}
+    {_dumps(function_info)}
 
     Step Parameters:
-    {json.dumps(step["parameters"], indent=2)}
+    {_dumps(step["parameters"])}
 
     Prior Results Available:
-    {json.dumps(prior_results, indent=2)}
+    {prior_json}
 
     Step Description:
     {step_description}
@@ -1246,16 +2311,16 @@ print(json.dumps(result))
                 prompt = f"""Format MLB Stats API endpoint URL.
 
     Endpoint Info:
-    {json.dumps(endpoint_info, indent=2)}
+    {_dumps(endpoint_info)}
 
     Base URL:
     {base_url}
 
     Step Parameters:
-    {json.dumps(step["parameters"], indent=2)}
+    {_dumps(step["parameters"])}
 
     Prior Results Available:
-    {json.dumps(prior_results, indent=2)}
+    {prior_json}
 
     Step Description:
     {step_description}
@@ -1288,13 +2353,18 @@ print(json.dumps(result))
 
             if step_type == "function":
                 # For functions, return the raw parameter string
-                return {"value": result.text.strip()}
+                resolved = {"value": result.text.strip()}
             else:
                 # For endpoints, return the complete URL
-                return {"url": result.text.strip()}
+                resolved = {"url": result.text.strip()}
+
+            await asyncio.to_thread(
+                self.params_cache.put, params_key, dict(resolved), params_context
+            )
+            return resolved
 
         except Exception as e:
-            print(f"Resolution error: {str(e)}")
+            logger.error(f"Resolution error: {str(e)}")
             # Fall back to basic resolution
             if step_type == "function":
                 return self._basic_parameter_resolution(
@@ -1327,20 +2397,21 @@ print(json.dumps(result))
         resolved = {}
         for param, value in parameters.items():
             if isinstance(value, str) and value.startswith("$"):
-                ref_parts = value[1:].split(".")
                 ref_data = prior_results
-                for part in ref_parts:
-                    if isinstance(ref_data, dict):
-                        ref_data = ref_data.get(part, {})
-                    else:
-                        print(f"Warning: Cannot resolve reference {value}")
+                for part in _reference_keys(value):
+                    if not isinstance(ref_data, dict):
+                        logger.warning(f"Cannot resolve reference {value}")
                         ref_data = {}
+                        break
+                    ref_data = ref_data.get(part, {})
                 resolved[param] = ref_data
             else:
                 resolved[param] = value
         return resolved
 
-    async def format_response(self, query: str, data: Dict[str, Any]) -> Any:
+    async def format_response(
+        self, query: str, data: Dict[str, Any], intent_json: Optional[str] = None
+    ) -> Any:
         """Get structured response content"""
         try:
             # Construct response schema and default fallback
@@ -1355,10 +2426,10 @@ print(json.dumps(result))
             Query: {query}
             
             Intent:
-            {json.dumps(self.intent)}
+            {intent_json or _dumps(self.intent)}
             
             Data:
-            {json.dumps(data)}
+            {_dumps(data)}
             
             Return JSON with:
             - summary: A brief overview (1-2 sentences)
@@ -1366,24 +2437,26 @@ print(json.dumps(result))
             - media: Optional media content (if applicable)"""
 
             try:
-                model_response = await self.gemini.generate_with_fallback(
+                # Streamed so the (often large) details arrive without blocking
+                # a thread on the full response
+                response_text = await self.gemini.generate_text_streamed(
                     prompt,
                     generation_config=genai.GenerationConfig(
                         response_mime_type="application/json"
                     ),
                 )
 
-                if not model_response or not hasattr(model_response, "text"):
+                if not response_text:
                     return default_response
 
-                return json.loads(model_response.text)
+                return orjson.loads(response_text)
 
             except Exception as e:
-                print(f"Model generation error: {str(e)}")
+                logger.error(f"Model generation error: {str(e)}")
                 return default_response
 
         except Exception as e:
-            print(f"Error in format_response: {str(e)}")
+            logger.error(f"Error in format_response: {str(e)}")
             return {
                 "summary": "Here's the baseball data I found.",
                 "details": data,
@@ -1394,29 +2467,17 @@ print(json.dumps(result))
         self,
         message: str,
         response_data: Optional[Any] = None,
+        intent_json: Optional[str] = None,
+        response_json: Optional[str] = None,
     ) -> str:
         """Generate a friendly conversational response"""
         try:
-            # First sanitize the response_data if it contains any Enum values
-            def sanitize_enum_values(obj):
-                if isinstance(obj, dict):
-                    return {k: sanitize_enum_values(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [sanitize_enum_values(item) for item in obj]
-                elif hasattr(obj, "value"):  # Check if it's an Enum
-                    return str(obj.value)
-                return obj
-
-            if response_data:
-                sanitized_response = sanitize_enum_values(response_data)
-            else:
-                sanitized_response = {}
-
+            # Enum values are written as their values by the encoder itself
             context = ""
-            if self.intent and sanitized_response:
+            if self.intent and response_data:
                 context = f"""
-                    Intent: {json.dumps(self.intent)}
-                    Data response: {json.dumps(sanitized_response, indent=2)}
+                    Intent: {intent_json or _dumps(self.intent)}
+                    Data response: {response_json or _dumps(response_data)}
                     """
 
             result = await self.gemini.generate_with_fallback(
@@ -1433,30 +2494,28 @@ print(json.dumps(result))
             )
             return result.text.strip()
         except Exception as e:
-            print(f"Error generating conversation: {str(e)}")
-            traceback.print_exc()
+            logger.exception(f"Error generating conversation: {e}")
             return "I'd be happy to talk baseball with you! What would you like to know about the game?"
 
-    def _get_default_suggestions(self) -> List[str]:
+    def _get_default_suggestions(self) -> Tuple[str, ...]:
         """Get default suggestions when no context-specific ones are available"""
-        return [
-            "Tell me about today's games",
-            "Who are the top players this season?",
-            "Show me the latest standings",
-            "What are some exciting home runs?",
-            "Tell me about your favorite baseball moment",
-        ]
+        return _DEFAULT_SUGGESTIONS
 
-    async def _generate_suggestions(self, response: Any) -> List[str]:
+    async def _generate_suggestions(
+        self,
+        response: Any,
+        intent_json: Optional[str] = None,
+        response_json: Optional[str] = None,
+    ) -> List[str]:
         """Generate contextual suggestions using LLM"""
-        result = await self.gemini.generate_with_fallback(
+        response_text = await self.gemini.generate_text_streamed(
             f"""{self.suggestion_prompt}
             
             Current intent:
-            {json.dumps(self.intent)}
+            {intent_json or _dumps(self.intent)}
             
             Current response:
-            {json.dumps(response, indent=2)}""",
+            {response_json or _dumps(response)}""",
             generation_config=genai.GenerationConfig(
                 response_mime_type="application/json",
                 response_schema={
@@ -1465,41 +2524,90 @@ print(json.dumps(result))
                 },
             ),
         )
-        return json.loads(result.text)
+        return orjson.loads(response_text)
+
+    async def close(self) -> None:
+        """Stop the REPL workers and persist pending cache writes"""
+        await self.repl.close()
+        for cache in (self.intent_cache, self.code_cache, self.params_cache):
+            await asyncio.to_thread(cache.flush)
 
     async def process_message(
         self, deps: MLBDeps, message: str, context: Dict[str, Any]
     ) -> MLBResponse:
         """Enhanced message processing with media resolution"""
         try:
-            # Get intent analysis
-            self.intent = await self.analyze_intent(f"{message}")
+            # Get intent analysis; the plan for a data query comes back with
+            # it and is served from plan_cache by create_data_plan below
+            self.intent = await self.analyze_and_plan(f"{message}", context, deps)
             self.user_query = message
-            self.intent_prompt = self.intent_prompt.replace(
-                "{{context}}", json.dumps(context, indent=2)
-            )
-            # MLB-related query path
-            if self.intent["is_mlb_related"] and self.intent["context"].get(
-                "requires_data", True
+            # MLB-related query path; chit-chat never reaches planning
+            if (
+                self.intent.get("is_mlb_related")
+                and self.intent["intent"]["type"] != IntentType.CONVERSATION
+                and self.intent["context"].get("requires_data", True)
             ):
                 try:
                     # Execute main data plan
-                    plan = await self.create_data_plan(self.intent)
-                    data = await self.execute_plan(deps, plan)
-                    response_data = await self.format_response(message, data)
-
-                    # Add media resolution step
-                    media = await self._resolve_media(deps, data, plan.get("steps", []))
+                    try:
+                        plan = await self.create_data_plan(self.intent, deps)
+                        data = await self.execute_plan(deps, plan)
+                    finally:
+                        self._cancel_started_steps(deps)
+
+                    # Media and chart only need the raw data and steps, so they
+                    # start while the response is still being formatted
+                    steps = plan.get("steps", [])
+                    media_task = asyncio.ensure_future(
+                        self._resolve_media(deps, data, steps)
+                    )
+                    chart_task = asyncio.ensure_future(
+                        self._resolve_chart(deps, data, steps)
+                    )
+                    # The intent and formatted response are embedded in several
+                    # prompts; serialize each once and share the text
+                    intent_json = _dumps(self.intent)
+                    response_data = await self.format_response(
+                        message, data, intent_json=intent_json
+                    )
+                    response_json = _dumps(response_data)
+
+                    # Suggestions and conversation depend on the formatted data
+                    (
+                        media,
+                        chart,
+                        suggestions,
+                        conversation,
+                    ) = await asyncio.gather(
+                        media_task,
+                        chart_task,
+                        self._generate_suggestions(
+                            response_data,
+                            intent_json=intent_json,
+                            response_json=response_json,
+                        ),
+                        self.generate_conversation(
+                            message,
+                            response_data,
+                            intent_json=intent_json,
+                            response_json=response_json,
+                        ),
+                        return_exceptions=True,
+                    )
 
+                    if isinstance(media, Exception):
+                        logger.error(f"Media resolution failed: {media}")
+                        media = None
                     if media:
                         response_data["media"] = media
-
-                    chart = await self._resolve_chart(deps, data, plan.get("steps", []))
-
-                    suggestions = await self._generate_suggestions(response_data)
-                    conversation = await self.generate_conversation(
-                        message, response_data
-                    )
+                    if isinstance(chart, Exception):
+                        logger.error(f"Chart resolution failed: {chart}")
+                        chart = None
+                    if isinstance(suggestions, Exception):
+                        logger.error(f"Suggestion generation failed: {suggestions}")
+                        suggestions = self._get_default_suggestions()
+                    if isinstance(conversation, Exception):
+                        raise conversation
 
                     result = {
                         "message": response_data["summary"],
@@ -1522,10 +2630,11 @@ print(json.dumps(result))
                     return translated_result
 
                 except Exception as execution_error:
-                    print(f"Execution error: {str(execution_error)}")
+                    logger.error(f"Execution error: {str(execution_error)}")
                     return self._create_error_response(message, str(execution_error))
 
             else:
+                self._cancel_started_steps(deps)
                 conversation = await self.generate_conversation(message, self.intent)
                 suggestions = self._get_default_suggestions()
 
@@ -1549,7 +2658,8 @@ print(json.dumps(result))
                 return translated_result
 
         except Exception as e:
-            print(f"Critical error in process_message: {str(e)}")
+            self._cancel_started_steps(deps)
+            logger.error(f"Critical error in process_message: {str(e)}")
             return self._create_error_response(message, str(e))
 
     async def _get_search_parameters(
@@ -1560,245 +2670,66 @@ print(json.dumps(result))
         and robust null value handling.
         """
         try:
-            # Get a small sample of homerun data for context
-            sample_homerun = self.homeruns.head(15).to_dict()
-
-            # Enhanced prompt focusing on specific, meaningful search parameters
-            media_prompt = """Based on this MLB context, generate a complete media plan with ready-to-use URLs and detailed, specific search parameters that capture the distinctive aspects of each home run.
-
-        Intent: {intent}
-        Data: {data}
-        Sample Homerun Data: {homerun_sample}
-        Available Media Sources: {media_sources}
-        User Query: {user_query}
-
-        Return a JSON object with:
-        1. direct_media: Array of ready-to-use media items with:
-        - type: "image" or "video"
-        - url: Complete URL (use templates below)
-        - description: Natural description
-        - metadata: Additional info (esp. for homeruns)
-
-        2. homerun_search: Object containing:
-        - keywords: Array of specific, distinctive search terms
-        - stats_criteria: Object with:
-            - min_exit_velocity: Optional minimum exit velocity
-            - max_exit_velocity: Optional maximum exit velocity
-            - min_launch_angle: Optional minimum launch angle
-            - max_launch_angle: Optional maximum launch angle
-            - min_distance: Optional minimum distance
-            - max_distance: Optional maximum distance
-        - player_names: Array containing batter names and mentioned players
-
-        URL Templates:
-        - Player headshots: https://img.mlbstatic.com/mlb-photos/image/upload/d_people:generic:headshot:67:current.png/w_213,q_auto:best/v1/people/[player_id]/headshot/67/current
-        - Team logos: https://www.mlbstatic.com/team-logos/[team_id].svg"""
-
-            # Format prompt with actual data
-            formatted_prompt = media_prompt.format(
-                intent=json.dumps(intent, indent=2, ensure_ascii=False),
-                data=json.dumps(data, indent=2, ensure_ascii=False),
-                homerun_sample=json.dumps(sample_homerun, indent=2, ensure_ascii=False),
-                media_sources=json.dumps(
-                    self.media_source, indent=2, ensure_ascii=False
-                ),
-                user_query=self.user_query,
-            )
+            intent_text = _dumps(intent)
+            data_text = _dumps(data)
+            # The plan depends only on the prompt inputs; homerun matching
+            # below is cheap and runs on a copy either way
+            media_context = {"intent": intent_text, "data": data_text}
+            cached_plan = self.media_cache.get_exact(self.user_query, media_context)
+            if cached_plan is not None:
+                media_plan = copy.deepcopy(cached_plan)
+            else:
+                # Format prompt with actual data
+                formatted_prompt = self.media_prompt.format_map(
+                    {
+                        "intent": intent_text,
+                        "data": data_text,
+                        "user_query": self.user_query,
+                    }
+                )
 
-            # Get media plan from LLM
-            result = await self.gemini.generate_with_fallback(
-                formatted_prompt,
-                generation_config=genai.GenerationConfig(
-                    temperature=0.1, response_mime_type="application/json"
-                ),
-            )
+                # Get media plan from LLM
+                result = await self.gemini.generate_with_fallback(
+                    formatted_prompt,
+                    generation_config=genai.GenerationConfig(
+                        temperature=0.1,
+                        response_mime_type="application/json",
+                        response_schema=_MEDIA_RESPONSE_SCHEMA,
+                    ),
+                )
 
-            try:
-                media_plan = json.loads(result.text)
-            except json.JSONDecodeError as json_error:
-                print(f"JSON parsing error: {str(json_error)}")
-                return {
-                    "direct_media": [],
-                    "homerun_search": {
-                        "keywords": [],
-                        "stats_criteria": {},
-                        "player_names": [],
-                    },
-                }
+                try:
+                    media_plan = orjson.loads(result.text)
+                except orjson.JSONDecodeError as json_error:
+                    logger.error(f"JSON parsing error: {str(json_error)}")
+                    return {
+                        "direct_media": [],
+                        "homerun_search": {
+                            "keywords": [],
+                            "stats_criteria": {},
+                            "player_names": [],
+                        },
+                    }
+                self.media_cache.put(
+                    self.user_query, copy.deepcopy(media_plan), media_context
+                )
 
             # Process homerun matches with enhanced null value handling
             if "homerun_search" in media_plan:
-                homerun_matches = []
-                search_criteria = media_plan["homerun_search"].get("stats_criteria", {})
-
-                for _, row in self.homeruns.iterrows():
-                    try:
-                        # Safely convert statistical values with null checking
-                        try:
-                            exit_velocity = (
-                                float(row["ExitVelocity"])
-                                if pd.notna(row["ExitVelocity"])
-                                else None
-                            )
-                            launch_angle = (
-                                float(row["LaunchAngle"])
-                                if pd.notna(row["LaunchAngle"])
-                                else None
-                            )
-                            hit_distance = (
-                                float(row["HitDistance"])
-                                if pd.notna(row["HitDistance"])
-                                else None
-                            )
-                        except (ValueError, TypeError):
-                            continue
-
-                        # Skip row if any required stat is missing
-                        if any(
-                            v is None
-                            for v in [exit_velocity, launch_angle, hit_distance]
-                        ):
-                            continue
-
-                        # Check if the homerun meets all statistical criteria with null-safe comparisons
-                        if search_criteria:
-                            if (
-                                (
-                                    "min_exit_velocity" in search_criteria
-                                    and (
-                                        exit_velocity is None
-                                        or exit_velocity
-                                        < search_criteria["min_exit_velocity"]
-                                    )
-                                )
-                                or (
-                                    "max_exit_velocity" in search_criteria
-                                    and (
-                                        exit_velocity is None
-                                        or exit_velocity
-                                        > search_criteria["max_exit_velocity"]
-                                    )
-                                )
-                                or (
-                                    "min_launch_angle" in search_criteria
-                                    and (
-                                        launch_angle is None
-                                        or launch_angle
-                                        < search_criteria["min_launch_angle"]
-                                    )
-                                )
-                                or (
-                                    "max_launch_angle" in search_criteria
-                                    and (
-                                        launch_angle is None
-                                        or launch_angle
-                                        > search_criteria["max_launch_angle"]
-                                    )
-                                )
-                                or (
-                                    "min_distance" in search_criteria
-                                    and (
-                                        hit_distance is None
-                                        or hit_distance
-                                        < search_criteria["min_distance"]
-                                    )
-                                )
-                                or (
-                                    "max_distance" in search_criteria
-                                    and (
-                                        hit_distance is None
-                                        or hit_distance
-                                        > search_criteria["max_distance"]
-                                    )
-                                )
-                            ):
-                                continue
-
-                        # Calculate text similarity scores with null-safe string handling
-                        title_scores = []
-                        player_scores = []
-
-                        if row["title"] and "keywords" in media_plan["homerun_search"]:
-                            row_title = str(row["title"]).lower()
-                            title_scores = [
-                                difflib.SequenceMatcher(
-                                    None, row_title, str(keyword).lower()
-                                ).ratio()
-                                for keyword in media_plan["homerun_search"]["keywords"]
-                                if keyword
-                            ]
-
-                        if (
-                            row["title"]
-                            and "player_names" in media_plan["homerun_search"]
-                        ):
-                            row_title = str(row["title"]).lower()
-                            player_scores = [
-                                difflib.SequenceMatcher(
-                                    None, row_title, str(player).lower()
-                                ).ratio()
-                                for player in media_plan["homerun_search"][
-                                    "player_names"
-                                ]
-                                if player
-                            ]
-
-                        # Use the best match from either keywords or player names
-                        best_score = (
-                            max(title_scores + player_scores)
-                            if (title_scores or player_scores)
-                            else 0
-                        )
-
-                        if best_score >= 0.55:  # Threshold for good matches
-                            homerun_matches.append(
-                                {
-                                    "type": "video",
-                                    "url": str(row["video"]),
-                                    "title": str(row["title"]),
-                                    "description": (
-                                        f"Incredible home run by {str(row['title']).split(' homers')[0]} with "
-                                        f"{exit_velocity:.1f} mph exit velocity, {launch_angle:.1f}° "
-                                        f"launch angle, traveling {hit_distance:.1f} feet!"
-                                    ),
-                                    "metadata": {
-                                        "exit_velocity": exit_velocity,
-                                        "launch_angle": launch_angle,
-                                        "distance": hit_distance,
-                                        "year": int(row["season"])
-                                        if pd.notna(row["season"])
-                                        else None,
-                                        "match_score": best_score,
-                                    },
-                                }
-                            )
-
-                    except Exception as row_error:
-                        print(f"Error processing row: {str(row_error)}")
-                        continue
-
-                # Sort matches by relevance and statistical impressiveness
+                # NumPy/rapidfuzz work runs in a thread so the loop stays free
+                homerun_matches = await asyncio.to_thread(
+                    self._rank_homeruns, media_plan["homerun_search"]
+                )
                 if homerun_matches:
-                    homerun_matches.sort(
-                        key=lambda x: (
-                            (x["metadata"]["exit_velocity"] or 0)
-                            * 0.4  # Weight exit velocity
-                            + (x["metadata"]["distance"] or 0) * 0.4  # Weight distance
-                            + (x["metadata"]["launch_angle"] or 0)
-                            * 0.2  # Weight launch angle
-                        ),
-                        reverse=True,
-                    )
-
                     # Add top matches to media plan
                     if "direct_media" not in media_plan:
                         media_plan["direct_media"] = []
-                    media_plan["direct_media"].extend(homerun_matches[:80])
+                    media_plan["direct_media"].extend(homerun_matches)
 
             return media_plan
 
         except Exception as e:
-            print(f"Error in media resolution: {str(e)}")
+            logger.error(f"Error in media resolution: {str(e)}")
             return {
                 "direct_media": [],
                 "homerun_search": {
@@ -1808,43 +2739,114 @@ print(json.dumps(result))
                 },
             }
 
+    def _rank_homeruns(self, homerun_search: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Top homerun clips matching the media plan's search, as media items"""
+        search_criteria = homerun_search.get("stats_criteria", {})
+
+        # Every title is scored against every distinct keyword and player
+        # name in one call; a row's match score is its best similarity
+        queries = list(
+            dict.fromkeys(
+                str(query).lower()
+                for query in (
+                    (homerun_search.get("keywords") or [])
+                    + (homerun_search.get("player_names") or [])
+                )
+                if query
+            )
+        )
+        if queries:
+            best_scores = (
+                fuzz_process.cdist(
+                    self._homerun_titles,
+                    queries,
+                    scorer=fuzz.ratio,
+                    dtype=np.float32,
+                    workers=-1,
+                    score_cutoff=55,
+                ).max(axis=1)
+                / 100.0
+            )
+        else:
+            best_scores = np.zeros(len(self._homerun_titles), np.float32)
+
+        columns = self._homerun_columns
+        exit_velocity = columns["ExitVelocity"]
+        launch_angle = columns["LaunchAngle"]
+        hit_distance = columns["HitDistance"]
+
+        # Absent criteria are open bounds; a NaN stat fails every
+        # comparison, so rows missing any stat drop out of the mask
+        def bound(key: str, default: float) -> float:
+            value = search_criteria.get(key)
+            return default if value is None else float(value)
+
+        mask = (
+            (exit_velocity >= bound("min_exit_velocity", -np.inf))
+            & (exit_velocity <= bound("max_exit_velocity", np.inf))
+            & (launch_angle >= bound("min_launch_angle", -np.inf))
+            & (launch_angle <= bound("max_launch_angle", np.inf))
+            & (hit_distance >= bound("min_distance", -np.inf))
+            & (hit_distance <= bound("max_distance", np.inf))
+        )
+        mask &= best_scores >= 0.55  # Threshold for good matches
+
+        # Rank by statistical impressiveness and keep the top 80; only
+        # those rows are turned into media items
+        candidates = np.flatnonzero(mask)
+        impact = (
+            exit_velocity[candidates] * 0.4  # Weight exit velocity
+            + hit_distance[candidates] * 0.4  # Weight distance
+            + launch_angle[candidates] * 0.2  # Weight launch angle
+        )
+        top = np.arange(len(candidates))
+        if len(candidates) > 80:
+            top = np.argpartition(-impact, 79)[:80]
+        # Highest impact first, ties in table order
+        top = top[np.lexsort((top, -impact[top]))]
+
+        # Pull the selected rows out of the table as Python lists in one go,
+        # with the stats at their stored precision
+        selected = candidates[top]
+        rows = self._homeruns_table.take(selected)
+        rows = zip(
+            # Selected rows always have a title: an empty one never matches
+            rows["title"].to_pylist(),
+            rows["video"].to_pylist(),
+            rows["season"].to_pylist(),
+            rows["ExitVelocity"].to_pylist(),
+            rows["LaunchAngle"].to_pylist(),
+            rows["HitDistance"].to_pylist(),
+            best_scores[selected].tolist(),
+        )
+        return [
+            {
+                "type": "video",
+                "url": str(video),
+                "title": title,
+                "description": (
+                    f"Incredible home run by {title.partition(' homers')[0]} with "
+                    f"{velocity:.1f} mph exit velocity, {angle:.1f}° "
+                    f"launch angle, traveling {distance:.1f} feet!"
+                ),
+                "metadata": {
+                    "exit_velocity": velocity,
+                    "launch_angle": angle,
+                    "distance": distance,
+                    "year": season,
+                    "match_score": score,
+                },
+            }
+            for title, video, season, velocity, angle, distance, score in rows
+        ]
+
     async def _resolve_chart(
         self, deps: MLBDeps, data: Dict[str, Any], steps: List[Dict[str, Any]]
     ) -> Dict[str, Any]:
         """Analyze if data can be visualized as a chart and return appropriate chart configuration"""
         try:
-            # Get chart documentation
-            chart_specs = self.charts_docs
-
-            # Create prompt for chart analysis
-            chart_prompt = """
-    Analyze this MLB data and determine if it can be visualized as a chart.
-
-    Data:
-    {data}
-
-    Available Chart Types:
-    {chart_specs}
-
-    Return a JSON object with:
-    1. requires_chart (boolean): Whether data should be displayed as a chart
-    2. chart_type (string): One of: "area", "bar", "pie", "radar", "radial" (if requires_chart is true)
-    3. variant (string): Specific variant of the chart type (if requires_chart is true)
-    4. formatted_data (array): Data formatted according to chart schema (if requires_chart is true)
-    5. title (string): Chart title (if requires_chart is true)
-    6. description (string): Brief description of what the chart shows (if requires_chart is true)
-
-    Focus on:
-    - Only suggest chart if data structure matches a chart type schema
-    - Choose most appropriate chart type for data visualization
-    - Format data to match exact schema requirements
-    - Return null for chart-specific fields if requires_chart is false
-    """
             # Format prompt with actual data
-            formatted_prompt = chart_prompt.format(
-                data=json.dumps(data, indent=2),
-                chart_specs=json.dumps(chart_specs, indent=2),
-            )
+            formatted_prompt = self.chart_prompt.format_map({"data": _dumps(data)})
 
             # Get chart recommendation from LLM
             result = await self.gemini.generate_with_fallback(
@@ -1886,7 +2888,7 @@ print(json.dumps(result))
                 ),
             )
 
-            chart_plan = json.loads(result.text)
+            chart_plan = orjson.loads(result.text)
 
             # Validate chart data if chart is required
             if chart_plan.get("requires_chart", False):
@@ -1905,10 +2907,6 @@ print(json.dumps(result))
                         f"Invalid chart type {chart_type} or variant {variant}"
                     )
 
-                # Validate data against schema
-                input_schema = variant_specs.get("inputSchema", {})
-                formatted_data = chart_plan.get("formatted_data", [])
-
                 # Add styling information
                 if (
                     "common" in self.charts_docs
@@ -1929,7 +2927,7 @@ print(json.dumps(result))
             return {"requires_chart": False}
 
         except Exception as e:
-            print(f"Error in chart resolution: {str(e)}")
+            logger.error(f"Error in chart resolution: {str(e)}")
             return {"requires_chart": False}
 
     async def _resolve_media(
@@ -1939,12 +2937,11 @@ print(json.dumps(result))
         try:
             # Get ready-to-use media items and homerun search terms
             media_plan = await self._get_search_parameters(self.intent, data)
-            print("meedia", media_plan)
+            logger.opt(lazy=True).debug("Media plan: {}", lambda: media_plan)
             # Analyze and enhance media items with descriptions
 
             return media_plan.get("direct_media")
 
         except Exception as e:
-            print(f"Media resolution error: {str(e)}")
-            traceback.print_exc()
+            logger.exception(f"Media resolution error: {e}")
             return []
@@ -1,7 +1,7 @@
 from datetime import datetime
 import google.generativeai as genai
 from google.generativeai.types import GenerateContentResponse
-import json
+import orjson
 from typing import Dict, Any, Optional, List, Union
 from loguru import logger
 import asyncio
@@ -14,6 +14,8 @@ from fastapi import HTTPException
 import mimetypes
 import cairosvg
 import os
+from src.api.gemini_solid import get_model
+from src.api.utils import strip_code_fences
 from src.core.settings import settings
 
 # Initialize mimetypes database
@@ -72,7 +74,7 @@ class MediaAnalyzer:
         """
         self.api_key = api_key
         genai.configure(api_key=api_key)
-        self.analysis_model = genai.GenerativeModel(model_name="gemini-2.0-flash-exp")
+        self.analysis_model = get_model("gemini-2.0-flash-exp")
 
         # Define supported image formats
         self.supported_formats = {
@@ -326,7 +328,7 @@ class MediaAnalyzer:
         Asynchronously generates content analysis using the Gemini model.
         Wraps the synchronous API call in an asyncio executor for better performance.
         """
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         return await loop.run_in_executor(
             None,
             partial(
@@ -367,7 +369,7 @@ class MediaAnalyzer:
                 
                 Context:
                 - Team Identifier: {user_message}
-                {f"- Additional Context: {json.dumps(metadata)}" if metadata else ""}
+                {f"- Additional Context: {orjson.dumps(metadata).decode()}" if metadata else ""}
                 
                 {base_response_structure}
                 
@@ -395,7 +397,7 @@ class MediaAnalyzer:
                 
                 Context:
                 - Player Image Reference: {user_message}
-                {f"- Additional Context: {json.dumps(metadata)}" if metadata else ""}
+                {f"- Additional Context: {orjson.dumps(metadata).decode()}" if metadata else ""}
                 
                 {base_response_structure}
                 
@@ -425,7 +427,7 @@ class MediaAnalyzer:
                 Context:
                 - Play Type: Game Highlight Video
                 - User Query: {user_message}
-                {f"- Additional Context: {json.dumps(metadata)}" if metadata else ""}
+                {f"- Additional Context: {orjson.dumps(metadata).decode()}" if metadata else ""}
                 
                 {base_response_structure}
                 
@@ -451,10 +453,7 @@ class MediaAnalyzer:
         Ensures the response contains all required fields and proper formatting.
         """
         try:
-            cleaned_text = (
-                response_text.replace("```json", "").replace("```", "").strip()
-            )
-            result = json.loads(cleaned_text)
+            result = orjson.loads(strip_code_fences(response_text))
 
             required_fields = ["summary", "details"]
             if not all(field in result for field in required_fields):
@@ -462,7 +461,7 @@ class MediaAnalyzer:
 
             return result
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             raise ValueError(f"Failed to parse analysis response: {e}")
 
 
@@ -0,0 +1,133 @@
+"""Coalesce concurrent requests into batched calls"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+
+class MicroBatcher:
+    """
+    Collects items submitted concurrently and hands them to a batch handler.
+
+    The first queued item opens a window; everything that arrives within it,
+    up to a target batch size, is dispatched together. The target is the
+    number of arrivals expected during one handler call (arrival rate x call
+    latency, both moving averages), clamped to [1, max_batch]. The window is
+    a fifth of the call latency, capped at max_wait. At low traffic the
+    target drops to 1 and items go out without waiting. The handler must
+    return one result per item, in order; when a batched call fails or returns
+    the wrong number of results, its items are retried one at a time so only
+    the items that fail on their own see an error.
+    """
+
+    # Weight of the newest sample in the latency and arrival-gap averages
+    SMOOTHING = 0.2
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 8,
+        max_wait: float = 0.02,
+    ):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._ema_latency: Optional[float] = None
+        self._ema_gap: Optional[float] = None
+        self._last_arrival: Optional[float] = None
+        self._last_report = 0.0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its share of the batch result"""
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._last_arrival is not None:
+            self._ema_gap = self._smooth(self._ema_gap, now - self._last_arrival)
+        self._last_arrival = now
+        future = loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    def _ensure_worker(self) -> None:
+        # The queue and worker are bound to the running loop, so create them lazily
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            target, window = self._batch_shape()
+            deadline = loop.time() + window
+
+            while len(batch) < target:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Dispatch without blocking collection of the next batch
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    def _batch_shape(self) -> Tuple[int, float]:
+        """Target batch size and collection window from the observed averages"""
+        if self._ema_latency is None or not self._ema_gap:
+            return self.max_batch, self.max_wait
+        expected = round(self._ema_latency / self._ema_gap)
+        target = min(max(expected, 1), self.max_batch)
+        return target, min(self._ema_latency * 0.2, self.max_wait)
+
+    def _smooth(self, average: Optional[float], sample: float) -> float:
+        if average is None:
+            return sample
+        return average + self.SMOOTHING * (sample - average)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self._handle([item for item, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # One malformed batched response must not fail unrelated items
+                logger.warning(
+                    f"Batch of {len(batch)} failed, retrying items singly: {str(e)}"
+                )
+                await asyncio.gather(*(self._dispatch([entry]) for entry in batch))
+                return
+            logger.error(f"Batch item failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _handle(self, items: List[Any]) -> List[Any]:
+        """Run the handler on a batch, checking it answered every item"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await self.handler(items)
+        self._ema_latency = self._smooth(self._ema_latency, loop.time() - started)
+        if started - self._last_report >= 1.0:
+            self._last_report = started
+            logger.debug(
+                f"Batch of {len(items)}: latency {self._ema_latency:.3f}s, "
+                f"queue depth {self._queue.qsize()}"
+            )
+        if len(results) != len(items):
+            raise ValueError(
+                f"Batch handler returned {len(results)} results for {len(items)} items"
+            )
+        return results
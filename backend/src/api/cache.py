@@ -0,0 +1,279 @@
+"""Local caches for Gemini structured outputs, so repeated questions skip the LLM"""
+
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import json
+from pathlib import Path
+import pickle
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+from numba import float32, int64, njit, types
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+# Seconds a put waits before the cache is written to disk, so a burst of puts
+# is persisted once
+SAVE_DELAY = 5.0
+
+
+def cache_key(query: str, context: Any = None) -> str:
+    """Exact-match key over the query and the context it was asked in"""
+    payload = json.dumps({"q": query, "ctx": context}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _context_id(context: Any) -> int:
+    """64-bit digest of a context, stored per L2 row to scope similarity matches"""
+    payload = json.dumps(context, sort_keys=True, default=str).encode()
+    digest = hashlib.blake2b(payload, digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+@lru_cache(maxsize=1)
+def _get_encoder() -> "SentenceTransformer":
+    # Deferred: importing sentence_transformers pulls in torch
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+@lru_cache(maxsize=2048)  # Identical strings skip the encoder entirely
+def embed_query(query: str) -> np.ndarray:
+    return _get_encoder().encode(query, normalize_embeddings=True).astype(np.float32)
+
+
+# Serial on purpose: a few thousand rows do not repay a numba thread-pool
+# dispatch, and lookups already run on asyncio.to_thread workers
+@njit(
+    types.Tuple((int64, float32))(float32[:, ::1], float32[::1], int64[::1], int64),
+    cache=True,
+    fastmath=True,
+)
+def _best_match(embeddings, vector, contexts, context):
+    """Fused dot product and argmax over the stored embeddings of one context"""
+    n, dim = embeddings.shape
+    best = -1
+    best_sim = np.float32(-2.0)  # Below any cosine similarity
+    for i in range(n):
+        if contexts[i] != context:
+            continue
+        acc = np.float32(0.0)
+        for j in range(dim):
+            acc += embeddings[i, j] * vector[j]
+        if acc > best_sim:
+            best = i
+            best_sim = acc
+    return best, best_sim
+
+
+class SemanticCache:
+    """
+    Two-tier cache: an exact-match LRU (L1) in front of a nearest-neighbour
+    search over normalized MiniLM query embeddings (L2).
+
+    L1 is keyed on (query, context) and answers in O(1). Each L2 row belongs to
+    the L1 entry it was stored under and is evicted with it, so maxsize bounds
+    both tiers. Rows live in a preallocated C-contiguous float32 matrix that
+    grows geometrically, and are scanned by a JIT-compiled kernel that fuses the
+    dot products with the argmax over rows stored in the same context; a stored
+    value is returned when the cosine similarity of the best match reaches the
+    threshold. Pass threshold=None for an exact-only cache. With a path, puts
+    are persisted in the background after SAVE_DELAY, and flush() writes any
+    pending ones immediately.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = 0.87,
+        path: Optional[str] = None,
+        maxsize: int = 1024,
+    ):
+        self.threshold = threshold
+        self.path = Path(path) if path else None
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._clear()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get_exact(self, query: str, context: Any = None) -> Optional[Any]:
+        """L1 lookup; cheap enough to call directly on the event loop"""
+        key = cache_key(query, context)
+        with self._lock:
+            if key not in self._l1:
+                return None
+            self._l1.move_to_end(key)
+            return self._l1[key]
+
+    def get_similar(self, query: str, context: Any = None) -> Optional[Any]:
+        """
+        L2 lookup for the closest query stored in the same context; hits are
+        backfilled into L1
+        """
+        if self.threshold is None or not self._values:
+            return None
+
+        vector = embed_query(query)
+        context_id = _context_id(context)
+        with self._lock:
+            size = len(self._values)
+            best, similarity = _best_match(
+                self._embeddings[:size], vector, self._contexts[:size], context_id
+            )
+            if similarity < self.threshold:
+                return None
+            value = self._values[best]
+            self._remember(cache_key(query, context), value)
+        return value
+
+    def get(self, query: str, context: Any = None) -> Optional[Any]:
+        """Return the cached value for the query, trying L1 before L2"""
+        value = self.get_exact(query, context)
+        if value is None:
+            value = self.get_similar(query, context)
+        return value
+
+    def put(self, query: str, value: Any, context: Any = None) -> None:
+        """Store a value in both tiers and schedule persisting it"""
+        key = cache_key(query, context)
+        vector = embed_query(query) if self.threshold is not None else None
+        with self._lock:
+            self._remember(key, value)
+            if vector is not None:
+                self._store_row(key, vector, _context_id(context), value)
+            if self.path and self._save_timer is None:
+                self._save_timer = threading.Timer(SAVE_DELAY, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self) -> None:
+        """Persist pending puts now instead of waiting for the save delay"""
+        with self._lock:
+            if self._save_timer is None:
+                return
+            self._save_timer.cancel()
+            self._save_timer = None
+            snapshot = self._snapshot()
+        # Written outside the lock so lookups are not held up by disk I/O
+        with self._write_lock:
+            self._write(snapshot)
+
+    def _clear(self) -> None:
+        self._l1: OrderedDict[str, Any] = OrderedDict()
+        # L2 rows: embedding, context id, value and owning L1 key per row
+        self._embeddings = np.empty((16, EMBEDDING_DIM), dtype=np.float32)
+        self._contexts = np.empty(16, dtype=np.int64)
+        self._values: List[Any] = []
+        self._row_keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._l1[key] = value
+        self._l1.move_to_end(key)
+        if len(self._l1) > self.maxsize:
+            evicted, _ = self._l1.popitem(last=False)
+            if evicted in self._rows:
+                self._drop_row(evicted)
+
+    def _store_row(
+        self, key: str, vector: np.ndarray, context_id: int, value: Any
+    ) -> None:
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._values)
+            if row == len(self._embeddings):
+                self._grow()
+            self._values.append(value)
+            self._row_keys.append(key)
+            self._rows[key] = row
+        else:
+            self._values[row] = value
+        self._embeddings[row] = vector
+        self._contexts[row] = context_id
+
+    def _grow(self) -> None:
+        # Doubling keeps puts amortized O(1) instead of copying the matrix each time
+        size = len(self._values)
+        embeddings = np.empty((2 * size, EMBEDDING_DIM), dtype=np.float32)
+        embeddings[:size] = self._embeddings[:size]
+        contexts = np.empty(2 * size, dtype=np.int64)
+        contexts[:size] = self._contexts[:size]
+        self._embeddings, self._contexts = embeddings, contexts
+
+    def _drop_row(self, key: str) -> None:
+        row = self._rows.pop(key)
+        last = len(self._values) - 1
+        if row != last:
+            # The last row fills the gap so rows stay contiguous
+            moved = self._row_keys[last]
+            self._embeddings[row] = self._embeddings[last]
+            self._contexts[row] = self._contexts[last]
+            self._values[row] = self._values[last]
+            self._row_keys[row] = moved
+            self._rows[moved] = row
+        self._values.pop()
+        self._row_keys.pop()
+
+    def _snapshot(self) -> Any:
+        if self.threshold is None:
+            return OrderedDict(self._l1)
+        size = len(self._values)
+        return {
+            "embeddings": self._embeddings[:size].copy(),
+            "contexts": self._contexts[:size].copy(),
+            "values": list(self._values),
+            "keys": list(self._row_keys),
+        }
+
+    def _load(self) -> None:
+        if not self.path or not self.path.with_suffix(".pkl").exists():
+            return
+        try:
+            with open(self.path.with_suffix(".pkl"), "rb") as f:
+                stored = pickle.load(f)
+            if self.threshold is None:
+                for key, value in stored.items():
+                    self._remember(key, value)
+                logger.info(f"Loaded {len(self._l1)} cached entries from {self.path}")
+                return
+
+            if not isinstance(stored, dict):
+                # Rows written before they carried a context could match any
+                # conversation, so they are not reused
+                logger.info(f"Discarding semantic cache without contexts: {self.path}")
+                return
+            embeddings = np.load(self.path.with_suffix(".npy"))
+            for key, vector, context_id, value in zip(
+                stored["keys"], embeddings, stored["contexts"], stored["values"]
+            ):
+                self._remember(key, value)
+                self._store_row(key, vector, int(context_id), value)
+            logger.info(f"Loaded {len(self._values)} cached entries from {self.path}")
+        except Exception as e:
+            logger.error(f"Failed to load semantic cache: {str(e)}")
+            self._clear()
+
+    def _write(self, snapshot: Any) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.threshold is None:
+                with open(self.path.with_suffix(".pkl"), "wb") as f:
+                    pickle.dump(snapshot, f)
+                return
+
+            np.save(self.path.with_suffix(".npy"), snapshot.pop("embeddings"))
+            with open(self.path.with_suffix(".pkl"), "wb") as f:
+                pickle.dump(snapshot, f)
+        except Exception as e:
+            logger.error(f"Failed to persist semantic cache: {str(e)}")
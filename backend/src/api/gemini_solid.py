@@ -1,10 +1,10 @@
 """Gemini With retry and fallback, got sick of 429 Errors"""
 
 import asyncio
-from functools import partial
-from typing import Any, Optional, Tuple
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 import google.generativeai as genai
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 from typing import Literal
 
 GEMINI_MODELS = [
@@ -15,26 +15,38 @@ GEMINI_MODELS = [
 ]
 
 
+# Identical requests in flight across every GeminiSolid instance, so concurrent
+# users asking the same thing share one call
+_INFLIGHT: Dict[Tuple[str, int, str, str], asyncio.Future] = {}
+
+# Backoff shared by plain and streamed calls once every model is rate limited
+_retry_rate_limits = retry(
+    stop=stop_after_attempt(4),
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    retry=retry_if_exception(lambda e: "429" in str(e)),
+)
+
+
+@lru_cache(maxsize=None)
+def get_model(model_name: str) -> genai.GenerativeModel:
+    """Shared GenerativeModel per name; models carry no per-request state"""
+    return genai.GenerativeModel(model_name)
+
+
 class GeminiSolid:
     def __init__(self):
         # Model hierarchy from fastest/smallest to most capable
         self.model_hierarchy = GEMINI_MODELS
 
-        # Initialize all models
+        # Models are process-wide, so short-lived instances cost a dict
         self.models = {
-            model_name: genai.GenerativeModel(model_name)
-            for model_name in self.model_hierarchy
+            model_name: get_model(model_name) for model_name in self.model_hierarchy
         }
 
     def is_rate_limit_error(self, exception: Exception) -> bool:
         """Check if the exception is a rate limit error"""
         return isinstance(exception, Exception) and "429" in str(exception)
 
-    @retry(
-        stop=stop_after_attempt(4),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=lambda x: isinstance(x, Exception) and "429" in str(x),
-    )
     async def generate_with_fallback(
         self,
         prompt: str,
@@ -44,8 +56,35 @@ class GeminiSolid:
     ) -> str:
         """
         Generate content with automatic model fallback on rate limit errors.
-        Returns the result of the first successful model.
+        Returns the result of the first successful model; callers making an
+        identical request while one is in flight share its result.
         """
+        key = (
+            model_name or "",
+            current_model_index,
+            prompt,
+            repr(generation_config),
+        )
+        pending = _INFLIGHT.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(
+                self._generate_with_retry(
+                    prompt, current_model_index, generation_config, model_name
+                )
+            )
+            _INFLIGHT[key] = pending
+            pending.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+        # Shielded so one caller's cancellation does not fail the others
+        return await asyncio.shield(pending)
+
+    @_retry_rate_limits
+    async def _generate_with_retry(
+        self,
+        prompt: str,
+        current_model_index: int = 0,
+        generation_config: Optional[Any] = None,
+        model_name: Optional[str] = None,
+    ) -> Any:
         if current_model_index >= len(self.model_hierarchy):
             raise Exception("All models exhausted")
 
@@ -55,8 +94,8 @@ class GeminiSolid:
 
             model = self.models[model_name]
 
-            result = await asyncio.to_thread(
-                model.generate_content, prompt, generation_config=generation_config
+            result = await model.generate_content_async(
+                prompt, generation_config=generation_config
             )
             return result
 
@@ -66,9 +105,71 @@ class GeminiSolid:
                 and current_model_index < len(self.model_hierarchy) - 1
             ):
                 # Try next model in hierarchy
-                return await self.generate_with_fallback(
+                return await self._generate_with_retry(
                     prompt=prompt,
                     current_model_index=current_model_index + 1,
                     generation_config=generation_config,
                 )
             raise
+
+    async def stream_with_fallback(
+        self,
+        prompt: str,
+        generation_config: Optional[Any] = None,
+        model_name: Optional[Literal[GEMINI_MODELS]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream the response text chunk by chunk over the async client.
+        Rate-limited models are skipped until one yields its first chunk;
+        errors after that propagate to the caller.
+        """
+        first, rest = await self._open_stream(prompt, generation_config, model_name)
+        if first is None:
+            return
+        # Trailing chunks may only carry finish metadata
+        if first.parts:
+            yield first.text
+        async for chunk in rest:
+            if chunk.parts:
+                yield chunk.text
+
+    @_retry_rate_limits
+    async def _open_stream(
+        self,
+        prompt: str,
+        generation_config: Optional[Any],
+        model_name: Optional[str],
+    ) -> Tuple[Optional[Any], AsyncIterator[Any]]:
+        """Start a stream and read its first chunk, falling back on 429s"""
+        candidates = [model_name] if model_name else []
+        candidates += [name for name in self.model_hierarchy if name != model_name]
+
+        for index, name in enumerate(candidates):
+            try:
+                response = await self.models[name].generate_content_async(
+                    prompt, generation_config=generation_config, stream=True
+                )
+                chunks = response.__aiter__()
+                # A rate limit can surface on the first read rather than the call
+                return await chunks.__anext__(), chunks
+            except StopAsyncIteration:
+                return None, chunks
+            except Exception as e:
+                if self.is_rate_limit_error(e) and index < len(candidates) - 1:
+                    continue
+                raise
+
+    async def generate_text_streamed(
+        self,
+        prompt: str,
+        generation_config: Optional[Any] = None,
+        model_name: Optional[Literal[GEMINI_MODELS]] = None,
+    ) -> str:
+        """Collect a streamed response without tying up a worker thread"""
+        chunks = [
+            chunk
+            async for chunk in self.stream_with_fallback(
+                prompt, generation_config=generation_config, model_name=model_name
+            )
+        ]
+        return "".join(chunks)
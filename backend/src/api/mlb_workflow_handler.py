@@ -1,17 +1,21 @@
-from typing import Optional, Dict, Any, List
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple
 import statsapi
 from enum import Enum
 from datetime import datetime, timedelta
 from loguru import logger
 from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
-import json
+import orjson
 from src.api.gemini_solid import GeminiSolid
+from src.core import load_homeruns_table
 import asyncio
 import google.generativeai as genai
-import pandas as pd
 from difflib import SequenceMatcher
 
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
 PLAYER_HEADSHOT_URL = "https://img.mlbstatic.com/mlb-photos/image/upload/d_people:generic:headshot:67:current.png/w_213,q_auto:best/v1/people/{player_id}/headshot/67/current.png"
 TEAM_LOGO_URL = "https://www.mlbstatic.com/team-logos/{team_id}.svg"
 
@@ -65,10 +69,37 @@ def get_team_stats_cached(team_id: int, season: Optional[int] = None) -> Dict[st
         raise
 
 
+def _name_ratio(a: str, b: str) -> float:
+    """SequenceMatcher ratio, skipping the matcher for identical names"""
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def _dumps(obj: Any) -> str:
+    """Compact JSON for prompts; statsapi payloads can carry integer keys"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+@lru_cache(maxsize=1)
+def _homerun_clips() -> Tuple["pd.DataFrame", "np.ndarray"]:
+    """Complete homerun rows and their lower-cased batter names, built once per process"""
+    homeruns = load_homeruns_table().to_pandas()
+    # Drop incomplete rows, so building the homerun list never hits a missing value
+    stat_columns = ["season", "ExitVelocity", "LaunchAngle", "HitDistance"]
+    homeruns = homeruns.dropna(subset=stat_columns).reset_index(drop=True)
+    # Batter names from the clip titles, lower-cased once for matching
+    batters = (
+        homeruns["title"].astype(str).str.partition(" homers")[0].str.lower().to_numpy()
+    )
+    return homeruns, batters
+
+
 class MLBWorkflowHandler:
-    def __init__(self, entity_id: str, entity_type: EntityType, chart_docs: str):
-        self.chart_docs = json.loads(chart_docs)["charts"]
-        self.homeruns = pd.read_csv("src/core/constants/mlb_homeruns.csv")
+    def __init__(
+        self, entity_id: str, entity_type: EntityType, chart_docs: Dict[str, Any]
+    ):
+        self.chart_docs = chart_docs["charts"]
         self.entity_id = int(entity_id)
         self.entity_type = entity_type
         self.gemini = GeminiSolid()
@@ -108,10 +139,10 @@ class MLBWorkflowHandler:
             formatted_prompt = f"""Analyze this MLB team's awards and achievements data to generate a comprehensive championship history.
             
             Team Info:
-            {json.dumps(team_info, indent=2)}
+            {_dumps(team_info)}
             
             Awards Data:
-            {json.dumps(awards_data, indent=2)}
+            {_dumps(awards_data)}
             
             Create a JSON response with the following structure:
             {{
@@ -159,7 +190,7 @@ class MLBWorkflowHandler:
             )
 
             # Parse Gemini response and combine with team info
-            championship_data = json.loads(result.text)
+            championship_data = orjson.loads(result.text)
 
             return championship_data
 
@@ -263,7 +294,7 @@ class MLBWorkflowHandler:
             formatted_prompt = f"""Analyze this MLB team statistics data and determine how to best visualize it.
 
             Data:
-            {json.dumps(stats_data, indent=2)}
+            {_dumps(stats_data)}
 
             Create a chart configuration that effectively visualizes these baseball statistics.
             Return a JSON structure with these fields:
@@ -295,7 +326,7 @@ class MLBWorkflowHandler:
             )
 
             # Parse Gemini response
-            chart_config = json.loads(result.text)
+            chart_config = orjson.loads(result.text)
 
             # Add styling information
             chart_config["styles"] = self.chart_docs["common"]["styling"]
@@ -411,7 +442,7 @@ class MLBWorkflowHandler:
             formatted_prompt = f"""Analyze this MLB player's career statistics data and determine how to best visualize it.
 
             Data:
-            {json.dumps(stat_data, indent=2)}
+            {_dumps(stat_data)}
 
             Create a chart configuration that effectively visualizes these baseball statistics.
             Return a JSON structure with these fields:
@@ -448,7 +479,7 @@ class MLBWorkflowHandler:
             )
 
             # Parse Gemini response
-            chart_config = json.loads(result.text)
+            chart_config = orjson.loads(result.text)
 
             # Add styling information
             chart_config["styles"] = self.chart_docs["common"]["styling"]
@@ -694,19 +725,12 @@ class MLBWorkflowHandler:
             player_name = player["fullName"]
 
             # Use difflib to find matching home runs
-            def calculate_similarity(row):
-                hr_name = str(row["title"]).split(" homers")[
-                    0
-                ]  # Using 'title' instead of 'description'
-                return SequenceMatcher(
-                    None, hr_name.lower(), player_name.lower()
-                ).ratio()
-
-            # Add similarity scores and filter matches
-            self.homeruns["similarity"] = self.homeruns.apply(
-                calculate_similarity, axis=1
-            )
-            matching_hrs = self.homeruns[self.homeruns["similarity"] > 0.8]
+            player_name_lower = player_name.lower()
+            homeruns, batters = _homerun_clips()
+            matches = [
+                _name_ratio(hr_name, player_name_lower) > 0.8 for hr_name in batters
+            ]
+            matching_hrs = homeruns[matches]
 
             # Convert matching rows to list of dictionaries
             homeruns_list = []
@@ -860,7 +884,7 @@ class MLBWorkflowHandler:
         - Records: AL/MLB records, franchise records, season bests
 
         Parse this player data and return only verified achievements:
-        {json.dumps(player_stats, indent=2)}"""
+        {_dumps(player_stats)}"""
 
             # Generate response using Gemini with error handling
             try:
@@ -873,7 +897,7 @@ class MLBWorkflowHandler:
                 )
 
                 # Parse and validate the response
-                parsed_result = json.loads(result.text)
+                parsed_result = orjson.loads(result.text)
 
                 # Ensure minimum required structure
                 required_fields = [
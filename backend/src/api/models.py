@@ -2,10 +2,9 @@ from httpx import AsyncClient
 from pydantic import BaseModel, HttpUrl
 import typing_extensions as typing
 import enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import NotRequired, TypedDict, List, Optional, Dict, Any, Literal
 from datetime import datetime
-from src.core import LANGUAGES_FOR_LABELLING
 from uuid import uuid4
 
 
@@ -14,13 +13,16 @@ class MLBDeps:
     client: AsyncClient
     season: int = 2025
     endpoints: Dict[str, Any] = None
+    # Root plan steps started while the plan was streaming: id -> (key, task)
+    started_steps: Dict[str, Any] = field(default_factory=dict)
 
 
 class REPLResult(TypedDict):
     status: str
     logs: List[str]
     error: Optional[str]
-    output: Optional[str]
+    # Last printed line, or the entry function's return value
+    output: Optional[Any]
 
 
 class MLBResponse(TypedDict):
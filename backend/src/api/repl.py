@@ -1,121 +1,167 @@
+import asyncio
 import os
-import tempfile
-import subprocess
-import json
+import struct
+import sys
+from typing import Any, Dict, Optional, Union
+
+import orjson
+from loguru import logger
 
 from src.api.models import REPLResult
 
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "repl_worker.py")
+HEADER = struct.Struct(">I")
+
 
 class MLBPythonREPL:
-    def __init__(self, timeout: int = 8):
+    """
+    Runs generated code in a small pool of persistent worker processes.
+
+    Workers are spawned on first use and reused across calls, so snippets
+    skip interpreter startup and the statsapi/pandas imports. Each call takes
+    an idle worker from the pool, so independent plan steps run in parallel;
+    a call that exceeds the timeout kills its worker and the slot starts a
+    fresh one on next use. start() boots every worker ahead of the first call.
+    """
+
+    def __init__(self, timeout: int = 8, workers: int = 2):
         self.timeout = timeout
+        self.workers = workers
+        self._idle: Optional[asyncio.Queue] = None
 
-    async def __call__(self, code: str) -> REPLResult:
+    async def __call__(
+        self,
+        code: str,
+        inputs: Optional[Dict[str, Any]] = None,
+        json_inputs: Optional[Dict[str, Union[str, bytes]]] = None,
+        entry: Optional[str] = None,
+    ) -> REPLResult:
         """
         Execute Python code and return structured result matching the MLB agent's expected format.
 
         Args:
             code (str): Python code to execute
+            inputs (dict): Variables bound in the code's namespace, sent with the
+                code instead of through temp files
+            json_inputs (dict): Like inputs, but already serialized to JSON text
+                or UTF-8 bytes; spliced into the frame as is
+            entry (str): Function the code defines; the worker calls it with the
+                inputs and returns its result, already decoded, as the output
 
         Returns:
             REPLResult containing:
                 status: "success" or "error"
                 logs: List of captured print/logging outputs
                 error: Error message if execution failed
-                output: Final expression result if execution succeeded
+                output: Last printed line, or the entry's return value, if
+                    execution succeeded
         """
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Create temp file for code execution
-            code_file_path = os.path.join(temp_dir, "mlb_analysis.py")
+        process = await self._slots().get()
+        try:
+            process = await self._ensure_worker(process)
+            payload = self._encode_request(code, inputs, json_inputs, entry)
+            process.stdin.write(HEADER.pack(len(payload)) + payload)
+            await process.stdin.drain()
+            return await asyncio.wait_for(self._read_result(process), self.timeout)
 
-            # Create wrapped code that handles execution and output capture
-            wrapped_code = f"""
-import sys
-import io
-
-# Capture stdout
-captured_output = io.StringIO()
-sys.stdout = captured_output
-
-try:
-    # Execute the provided code
-    {code.replace("\n", "\n    ")}
-
-    # Get captured output
-    sys.stdout = sys.__stdout__
-    logs = captured_output.getvalue().strip().split('\\n')
-    
-    # The last print statement's output will be our result
-    result = logs[-1] if logs else None
-    logs = logs[:-1] if logs else []
-    
-    # Return success result
-    print(json.dumps({{
-        "status": "success",
-        "logs": logs,
-        "error": None,
-        "output": result
-    }}))
-
-except Exception as e:
-    # Get captured output up to error
-    sys.stdout = sys.__stdout__
-    logs = captured_output.getvalue().strip().split('\\n')
-    
-    # Return error result
-    print(json.dumps({{
-        "status": "error",
-        "logs": logs,
-        "error": str(e),
-        "output": None
-    }}))
-"""
-            # Write the wrapped code to temp file
-            with open(code_file_path, "w", encoding="utf-8") as f:
-                f.write(wrapped_code)
-                print("repl code", wrapped_code)
-
-            try:
-                # Execute the code
-                result = subprocess.run(
-                    ["python3", code_file_path],
-                    capture_output=True,
-                    check=False,
-                    text=True,
-                    timeout=self.timeout,
-                )
-
-                # Parse the JSON result
-                if result.returncode == 0:
-                    try:
-                        return json.loads(result.stdout.strip())
-                    except json.JSONDecodeError:
-                        return {
-                            "status": "error",
-                            "logs": [],
-                            "error": "Failed to parse execution result",
-                            "output": None,
-                        }
-                else:
-                    # Clean up error message
-                    error_lines = result.stderr.split("\n")
-                    cleaned_errors = [
-                        line.replace(code_file_path, "<analysis>")
-                        for line in error_lines
-                    ]
-                    error_msg = "\n".join(cleaned_errors)
-
-                    return {
-                        "status": "error",
-                        "logs": [],
-                        "error": error_msg,
-                        "output": None,
-                    }
-
-            except subprocess.TimeoutExpired:
-                return {
-                    "status": "error",
-                    "logs": [],
-                    "error": f"Execution timed out after {self.timeout} seconds",
-                    "output": None,
-                }
+        except asyncio.TimeoutError:
+            process = await self._kill_worker(process)
+            return {
+                "status": "error",
+                "logs": [],
+                "error": f"Execution timed out after {self.timeout} seconds",
+                "output": None,
+            }
+        except (asyncio.IncompleteReadError, BrokenPipeError, ConnectionError):
+            process = await self._kill_worker(process)
+            return {
+                "status": "error",
+                "logs": [],
+                "error": "Execution worker exited unexpectedly",
+                "output": None,
+            }
+        except asyncio.CancelledError:
+            # The worker may still answer this call; never hand it to the next one
+            if process is not None and process.returncode is None:
+                process.kill()
+            process = None
+            raise
+        finally:
+            self._idle.put_nowait(process)
+
+    async def start(self) -> None:
+        """Boot every worker now, so the first requests skip interpreter startup."""
+        slots = self._slots()
+        processes = [slots.get_nowait() for _ in range(slots.qsize())]
+        try:
+            processes = await asyncio.gather(*map(self._ensure_worker, processes))
+        finally:
+            for process in processes:
+                slots.put_nowait(process)
+
+    async def close(self) -> None:
+        """Stop the idle workers; busy ones exit on stdin EOF with the app."""
+        if self._idle is None:
+            return
+        processes = [self._idle.get_nowait() for _ in range(self._idle.qsize())]
+        for process in processes:
+            self._idle.put_nowait(await self._kill_worker(process))
+
+    def _slots(self) -> asyncio.Queue:
+        if self._idle is None:
+            # Slots hold a worker process, or None until one is needed
+            self._idle = asyncio.Queue()
+            for _ in range(self.workers):
+                self._idle.put_nowait(None)
+        return self._idle
+
+    @staticmethod
+    def _encode_request(
+        code: str,
+        inputs: Optional[Dict[str, Any]],
+        json_inputs: Optional[Dict[str, Union[str, bytes]]],
+        entry: Optional[str] = None,
+    ) -> bytes:
+        # inputs must stay the last key for the splice below
+        payload = orjson.dumps(
+            {"code": code, "entry": entry, "inputs": inputs or {}},
+            option=orjson.OPT_NON_STR_KEYS,
+            default=str,
+        )
+        if not json_inputs:
+            return payload
+
+        # payload ends with the inputs object's closing braces: `...{...}}`
+        spliced = b",".join(
+            orjson.dumps(name)
+            + b":"
+            + (text if isinstance(text, bytes) else text.encode())
+            for name, text in json_inputs.items()
+        )
+        separator = b"," if inputs else b""
+        return payload[:-2] + separator + spliced + b"}}"
+
+    async def _ensure_worker(
+        self, process: Optional[asyncio.subprocess.Process]
+    ) -> asyncio.subprocess.Process:
+        if process is None or process.returncode is not None:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                WORKER_PATH,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+            )
+            # An empty frame means the worker has finished its imports
+            await process.stdout.readexactly(HEADER.size)
+            logger.info(f"Started REPL worker (pid {process.pid})")
+        return process
+
+    async def _read_result(self, process: asyncio.subprocess.Process) -> REPLResult:
+        (size,) = HEADER.unpack(await process.stdout.readexactly(HEADER.size))
+        return orjson.loads(await process.stdout.readexactly(size))
+
+    async def _kill_worker(self, process: Optional[asyncio.subprocess.Process]) -> None:
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+        return None
@@ -0,0 +1,117 @@
+"""
+Long-lived worker process for MLBPythonREPL.
+
+Reads length-prefixed JSON frames ({"code": ..., "entry": ..., "inputs": {...}})
+from stdin and answers each with a REPLResult frame on stdout, after an empty
+frame signalling that the preloads are done. With an entry, the code only
+defines that function; the worker calls it with the inputs and sends its
+result as the output, encoded only as part of the frame. Runs as a plain script
+so it does not import the application package.
+"""
+
+import contextlib
+from functools import lru_cache
+import io
+import json
+import math
+import os
+import struct
+import sys
+
+HEADER = struct.Struct(">I")
+
+# Modules generated code commonly needs, imported once for the worker's lifetime
+PRELOADED = {}
+for _name in ("json", "datetime", "statsapi", "pandas"):
+    try:
+        PRELOADED[_name] = __import__(_name)
+    except ImportError:
+        pass
+
+
+@lru_cache(maxsize=512)
+def _compile(code: str):
+    # Keyed on the source itself: str hashing is cheaper than a digest, and
+    # the bound keeps a long-lived worker from growing without limit
+    return compile(code, "<analysis>", "exec")
+
+
+def _run(code: str, inputs: dict, entry: str = None) -> dict:
+    captured = io.StringIO()
+    namespace = {"__name__": "__main__", **PRELOADED, **inputs}
+    error = output = None
+    try:
+        with contextlib.redirect_stdout(captured):
+            exec(_compile(code), namespace)
+            if entry is not None:
+                output = namespace[entry](*inputs.values())
+    except BaseException as e:  # SystemExit from user code must not kill the worker
+        error = str(e) or type(e).__name__
+
+    printed = captured.getvalue().strip()
+    logs = printed.split("\n")
+    if error is not None:
+        return {"status": "error", "logs": logs, "error": error, "output": None}
+    if entry is not None:
+        logs = logs if printed else []
+        return {"status": "success", "logs": logs, "error": None, "output": output}
+
+    # The last print statement's output is the result
+    return {"status": "success", "logs": logs[:-1], "error": None, "output": logs[-1]}
+
+
+def _finite(value):
+    """Replace NaN and infinities, which the parent's JSON parser rejects"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _encode(result: dict) -> bytes:
+    try:
+        return json.dumps(result, default=str, allow_nan=False).encode()
+    except ValueError as e:
+        error = e
+    try:
+        return json.dumps(_finite(result), default=str, allow_nan=False).encode()
+    except (ValueError, RecursionError):  # An entry returned a circular structure
+        result.update(status="error", error=str(error), output=None)
+        return json.dumps(result, default=str).encode()
+
+
+def _read_exact(stream, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError
+    return data
+
+
+def main():
+    stdin = sys.stdin.buffer
+    # Keep the protocol on a private fd; stray writes to fd 1 land on stderr
+    out = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    out.write(HEADER.pack(0))
+    out.flush()
+
+    while True:
+        try:
+            (size,) = HEADER.unpack(_read_exact(stdin, HEADER.size))
+            request = json.loads(_read_exact(stdin, size))
+        except EOFError:
+            return
+
+        result = _run(
+            request["code"], request.get("inputs") or {}, request.get("entry")
+        )
+        payload = _encode(result)
+        out.write(HEADER.pack(len(payload)) + payload)
+        out.flush()
+
+
+if __name__ == "__main__":
+    main()
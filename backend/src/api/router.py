@@ -1,7 +1,4 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Depends
-import httpx
-from numpy import char
-from src.core import LANGUAGES_FOR_LABELLING
 from src.api.models import (
     ChatRequest,
     VideoAnalysisRequest,
@@ -14,12 +11,12 @@ from src.api.agent import MLBDeps
 from src.api.analysis import MediaAnalyzer, get_analyzer, media_analyzer
 from src.api.utils import log_analysis_request, _build_chat_context, translate_response
 from src.api.mlb_workflow_handler import MLBWorkflowHandler
+from src.core import load_constant
 from fastapi_simple_rate_limiter import rate_limiter
 from fastapi.requests import Request
 from loguru import logger
 from datetime import datetime
 import re
-import json
 
 # Configure router with proper prefixes and tags
 router = APIRouter(
@@ -40,27 +37,24 @@ async def chat(request: Request, chat_request: ChatRequest):
 
     This endpoint handles general chat interactions, maintaining context and user preferences.
     """
-    from src.main import get_mlb_agent
+    from src.main import get_http_client, get_mlb_agent
 
     mlb_agent = get_mlb_agent()
-    async with httpx.AsyncClient() as client:
-        try:
-            # Set up dependencies and context
-            deps = MLBDeps(client=client)
-            context = _build_chat_context(chat_request)
+    try:
+        # Set up dependencies and context
+        deps = MLBDeps(client=get_http_client())
+        context = _build_chat_context(chat_request)
 
-            # Process the message with the MLB agent
-            result = await mlb_agent.process_message(
-                deps=deps, message=chat_request.message, context=context
-            )
+        # Process the message with the MLB agent
+        result = await mlb_agent.process_message(
+            deps=deps, message=chat_request.message, context=context
+        )
 
-            return result
+        return result
 
-        except Exception as e:
-            logger.error(f"Chat processing failed: {e}")
-            raise HTTPException(
-                status_code=500, detail=f"Error processing chat: {str(e)}"
-            )
+    except Exception as e:
+        logger.error(f"Chat processing failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
 
 @router.post(
@@ -189,7 +183,7 @@ async def analyze_image(
         raise
 
 
-chart_docs = open("src/core/constants/charts_docs.json", "r").read()
+chart_docs = load_constant("charts_docs.json")
 
 
 @router.post(
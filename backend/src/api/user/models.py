@@ -1,8 +1,8 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Dict, Any
 from pydantic import BaseModel
 import google.generativeai as genai
 from fastapi import HTTPException
-import json
+import orjson
 from src.api.gemini_solid import GeminiSolid
 
 
@@ -29,7 +29,7 @@ async def analyze_user_preferences(request: UpdateUserDataRequest) -> Dict[str,
 
         prompt = f"""
         Analyze this user's baseball chat history and preferences:
-        {json.dumps(data_context, indent=2)}
+        {orjson.dumps(data_context, option=orjson.OPT_NON_STR_KEYS).decode()}
 
         Based on the conversation and current preferences, generate updated user preferences.
         Follow this schema EXACTLY:
@@ -82,9 +82,9 @@ async def analyze_user_preferences(request: UpdateUserDataRequest) -> Dict[str,
 
         # Parse and validate the response
         try:
-            updated_preferences = json.loads(response.text)
+            updated_preferences = orjson.loads(response.text)
             return updated_preferences
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             raise ValueError("Invalid JSON response from Gemini")
 
     except Exception as e:
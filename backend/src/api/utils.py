@@ -1,11 +1,20 @@
 from datetime import datetime
+import re
 from typing import Dict, Any, Optional
 from src.api.gemini_solid import GeminiSolid
 import google.generativeai as genai
 from src.api.models import ChatRequest, MLBResponse
 from src.core import LANGUAGES_FOR_LABELLING
 from loguru import logger
-import json
+import orjson
+
+# Markdown code fences around model output, stripped in one pass
+_FENCE_RE = re.compile(r"```(?:python|json)?\n?")
+
+
+def strip_code_fences(text: str) -> str:
+    """Model output without its markdown code fences and surrounding whitespace"""
+    return _FENCE_RE.sub("", text).strip()
 
 
 def sanitize_code(code: str) -> str:
@@ -132,7 +141,7 @@ async def log_analysis_request(
             "error": error,
         }
 
-        logger.info(f"Analysis request logged: {json.dumps(log_entry)}")
+        logger.info(f"Analysis request logged: {orjson.dumps(log_entry).decode()}")
 
     except Exception as e:
         logger.error(f"Failed to log analysis request: {e}")
@@ -180,7 +189,9 @@ async def translate_response(response: Any, target_language: str) -> MLBResponse
 
     try:
         # Convert the response to JSON using the custom datetime handler
-        response_json = json.dumps(response, indent=2, default=datetime_handler)
+        response_json = orjson.dumps(
+            response, default=datetime_handler, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
 
         prompt = f"""Translate this MLB baseball response from English to {target_language}.
             The response is provided as JSON. Return the exact same JSON structure.
@@ -207,12 +218,9 @@ async def translate_response(response: Any, target_language: str) -> MLBResponse
             ),
         )
 
-        return json.loads(result.text)
+        return orjson.loads(result.text)
 
     except Exception as e:
-        print(f"Translation error: {str(e)}")
         # Log the full error details for debugging
-        import traceback
-
-        print(f"Full traceback: {traceback.format_exc()}")
+        logger.exception(f"Translation error: {str(e)}")
         return response
@@ -1 +1,26 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import orjson
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+CONSTANTS_DIR = Path("src/core/constants")
+
 LANGUAGES_FOR_LABELLING = {"en": "English", "ja": "Japanese", "sp": "Spanish"}
+
+
+@lru_cache(maxsize=None)
+def load_constant(filename: str) -> Any:
+    """Parse a constants JSON file once per process; treat the result as read-only"""
+    return orjson.loads((CONSTANTS_DIR / filename).read_bytes())
+
+
+@lru_cache(maxsize=None)
+def load_homeruns_table() -> "pa.Table":
+    """Memory-map the homerun clips once per process; Arrow tables are immutable"""
+    import pyarrow.parquet as pq
+
+    return pq.read_table(CONSTANTS_DIR / "mlb_homeruns.parquet", memory_map=True)
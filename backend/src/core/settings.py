@@ -9,6 +9,22 @@ class Settings(BaseSettings):
 
     GEMINI_API_KEY: str
     ALLOWED_ORIGINS: List[str]
+    CACHE_DIR: str = ".cache"
+    # Plan steps running at once across all requests, to stay under MLB API limits
+    MAX_PARALLEL_STEPS: int = 8
+    # Upper bounds for coalescing concurrent intent analyses into one Gemini call;
+    # the batcher shrinks both when traffic is light
+    INTENT_BATCH_WINDOW_MS: int = 20
+    INTENT_MAX_BATCH: int = 16
+    # Standalone intent classification (analyze_intent, the fallback when the
+    # combined intent+plan call fails) is short structured output; the 8B model
+    # handles it. The combined call drafts the plan too and keeps the plan model
+    INTENT_MODEL: str = "gemini-1.5-flash-8b"
+    # Persistent worker processes that run generated code
+    REPL_WORKERS: int = 4
+    # Seconds an MLB API response is reused in memory; live game endpoints
+    # are never reused
+    HTTP_CACHE_TTL: int = 300
 
 
 settings = Settings()
@@ -1,11 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import hishel
+import httpx
 from loguru import logger
 from pathlib import Path
 
 from src.api.router import router as chat_router
 from src.api.user.router import router as user_router
+from src.core import load_constant
 from src.core.settings import settings
 from src.api.agent import MLBAgent
 
@@ -15,6 +18,25 @@ json_data = {"endpoints": None, "functions": None, "media": None, "charts": None
 # Global MLB agent instance
 mlb_agent = None
 
+# Shared HTTP client for MLB API calls
+http_client = None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    HTTP/2 client with a shared connection pool and an RFC 9111 response cache,
+    so concurrent plan steps multiplex over one connection and cacheable MLB
+    responses are revalidated instead of re-downloaded.
+    """
+    transport = hishel.AsyncCacheTransport(
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        ),
+        storage=hishel.AsyncFileStorage(base_path=Path(settings.CACHE_DIR) / "http"),
+    )
+    return httpx.AsyncClient(transport=transport, timeout=30.0)
+
 
 @asynccontextmanager
 async def load_json_data(app: FastAPI):
@@ -23,36 +45,33 @@ async def load_json_data(app: FastAPI):
     This ensures resources are properly loaded before handling any requests.
     """
     try:
-        # Define the base path for JSON files
-        base_path = Path("src/core/constants")
-
-        # Load all JSON files
-        with open(base_path / "endpoints.json", "r") as f:
-            json_data["endpoints"] = f.read()
-
-        with open(base_path / "mlb_functions.json", "r") as f:
-            json_data["functions"] = f.read()
-
-        with open(base_path / "media_sources.json", "r") as f:
-            json_data["media"] = f.read()
-
-        with open(base_path / "charts_docs.json", "r") as f:
-            json_data["charts"] = f.read()
+        # Parsed once per process and shared with every consumer
+        json_data["endpoints"] = load_constant("endpoints.json")
+        json_data["functions"] = load_constant("mlb_functions.json")
+        json_data["media"] = load_constant("media_sources.json")
+        json_data["charts"] = load_constant("charts_docs.json")
 
         logger.info(f"Loaded JSON data: successfully loaded all files")
         # Initialize MLB agent with loaded data
-        global mlb_agent
+        global mlb_agent, http_client
+        http_client = create_http_client()
         mlb_agent = MLBAgent(
             api_key=settings.GEMINI_API_KEY,
-            endpoints_json=json_data["endpoints"],
-            functions_json=json_data["functions"],
-            media_json=json_data["media"],
-            charts_json=json_data["charts"],
+            endpoints=json_data["endpoints"],
+            functions=json_data["functions"],
+            media=json_data["media"],
+            charts=json_data["charts"],
         )
+        await mlb_agent.repl.start()
 
         yield
     finally:
         # Clean up resources if needed
+        if mlb_agent is not None:
+            await mlb_agent.close()
+        if http_client is not None:
+            await http_client.aclose()
+            http_client = None
         json_data["endpoints"] = None
         json_data["functions"] = None
         json_data["media"] = None
@@ -92,3 +111,13 @@ def get_mlb_agent() -> MLBAgent:
     if mlb_agent is None:
         raise RuntimeError("MLB agent not initialized")
     return mlb_agent
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client.
+    Route handlers should use this instead of opening a client per request.
+    """
+    if http_client is None:
+        raise RuntimeError("HTTP client not initialized")
+    return http_client
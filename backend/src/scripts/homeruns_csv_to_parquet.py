@@ -0,0 +1,28 @@
+"""One-off conversion of the homerun CSV into a Parquet file the agent can memory-map."""
+
+from pathlib import Path
+
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+CONSTANTS_DIR = Path("src/core/constants")
+
+
+def main():
+    csv_path = CONSTANTS_DIR / "mlb_homeruns.csv"
+    parquet_path = CONSTANTS_DIR / "mlb_homeruns.parquet"
+
+    # Multithreaded CSV parse straight into Arrow columns; empty strings become
+    # nulls so the frame matches what pandas.read_csv produced
+    table = pv.read_csv(
+        csv_path, convert_options=pv.ConvertOptions(strings_can_be_null=True)
+    )
+
+    pq.write_table(table, parquet_path)
+
+    print(f"Converted {table.num_rows} rows: {csv_path} -> {parquet_path}")
+    print(f"Schema:\n{table.schema}")
+
+
+if __name__ == "__main__":
+    main()
@@ -63,8 +63,7 @@ class MLBDocsParser:
             - Include all notes found in the documentation
             """
 
-            result = await asyncio.to_thread(
-                self.model.generate_content,
+            result = await self.model.generate_content_async(
                 prompt,
                 generation_config=genai.GenerationConfig(
                     temperature=0.1, response_mime_type="application/json"
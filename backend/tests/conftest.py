@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests import the app as `src.*`, the same way uvicorn runs it from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time and have no defaults for these
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("ALLOWED_ORIGINS", '["*"]')
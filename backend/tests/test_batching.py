@@ -0,0 +1,39 @@
+import asyncio
+
+from src.api.batching import MicroBatcher
+
+
+def _submit_together(batcher, items):
+    async def run():
+        return await asyncio.gather(
+            *(batcher.submit(item) for item in items), return_exceptions=True
+        )
+
+    return asyncio.run(run())
+
+
+def test_count_mismatch_retries_items_singly():
+    calls = []
+
+    async def handler(items):
+        calls.append(list(items))
+        # A malformed batched response drops an answer
+        return [item * 2 for item in items][: max(len(items) - 1, 1)]
+
+    results = _submit_together(MicroBatcher(handler, max_wait=0.05), [1, 2, 3])
+
+    assert results == [2, 4, 6]
+    assert calls[0] == [1, 2, 3]
+    assert sorted(calls[1:]) == [[1], [2], [3]]
+
+
+def test_only_the_failing_item_sees_the_error():
+    async def handler(items):
+        if "bad" in items:
+            raise RuntimeError("unparseable response")
+        return [item.upper() for item in items]
+
+    results = _submit_together(MicroBatcher(handler, max_wait=0.05), ["a", "bad", "c"])
+
+    assert results[0] == "A" and results[2] == "C"
+    assert isinstance(results[1], RuntimeError)
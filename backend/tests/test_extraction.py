@@ -0,0 +1,44 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.api.agent import MLBAgent
+
+EXTRACT = {"fields": {"team_ids": "$.teams[*].id"}}
+
+
+async def _no_llm(*args, **kwargs):
+    raise AssertionError("JSONPath extraction must not call Gemini")
+
+
+def _agent():
+    agent = MLBAgent.__new__(MLBAgent)
+    agent.gemini = SimpleNamespace(generate_with_fallback=_no_llm)
+    return agent
+
+
+def test_jsonpath_fields_are_extracted_without_llm():
+    data = {"teams": [{"id": 147}, {"id": 121}]}
+    result = asyncio.run(_agent()._process_extraction(data, EXTRACT))
+    assert result == {"team_ids": [147, 121]}
+
+
+def test_empty_jsonpath_match_is_a_result():
+    result = asyncio.run(_agent()._process_extraction({"teams": []}, EXTRACT))
+    assert result == {"team_ids": []}
+
+
+def test_endpoint_step_output_is_not_extracted_twice():
+    agent = _agent()
+    agent._step_slots = asyncio.Semaphore(1)
+    extracted = {"team_ids": [147]}
+
+    async def execute_step(deps, step, prior_results):
+        return extracted
+
+    async def extract_again(*args, **kwargs):
+        raise AssertionError("endpoint steps extract in _execute_endpoint_step")
+
+    agent._execute_step = execute_step
+    agent._process_extraction = extract_again
+    step = {"id": "teams", "type": "endpoint", "name": "teams", "extract": EXTRACT}
+    assert asyncio.run(agent._run_plan_step(None, step, {})) is extracted
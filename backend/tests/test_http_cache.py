@@ -0,0 +1,42 @@
+import asyncio
+from types import SimpleNamespace
+
+from cachetools import TTLCache
+
+from src.api.agent import MLBAgent
+
+URL = "https://statsapi.mlb.com/api/v1/game/745123/feed/live"
+
+
+def _agent_counting_fetches():
+    agent = MLBAgent.__new__(MLBAgent)
+    agent._http_cache = TTLCache(maxsize=8, ttl=300)
+    fetched = []
+
+    async def get(url):
+        fetched.append(url)
+        return SimpleNamespace(content=b"{}", raise_for_status=lambda: None)
+
+    return agent, SimpleNamespace(client=SimpleNamespace(get=get)), fetched
+
+
+def _fetch_twice(agent, deps, endpoint_name, url):
+    async def run():
+        for _ in range(2):
+            await agent._fetch_content(deps, endpoint_name, url)
+
+    asyncio.run(run())
+
+
+def test_live_game_feed_bypasses_url_cache():
+    agent, deps, fetched = _agent_counting_fetches()
+    _fetch_twice(agent, deps, "game", URL)
+    assert fetched == [URL, URL]
+    assert URL not in agent._http_cache
+
+
+def test_static_endpoint_is_reused_within_ttl():
+    agent, deps, fetched = _agent_counting_fetches()
+    url = "https://statsapi.mlb.com/api/v1/people/592450"
+    _fetch_twice(agent, deps, "people", url)
+    assert fetched == [url]
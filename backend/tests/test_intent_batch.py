@@ -0,0 +1,54 @@
+import orjson
+import pytest
+
+from src.api.agent import MLBAgent
+
+
+def _analysis(description):
+    return {
+        "intent": {
+            "type": "schedule",
+            "description": description,
+            "specificity": "specific",
+            "timeframe": "current",
+            "complexity": "simple",
+        },
+        "entities": {
+            key: []
+            for key in ("teams", "players", "dates", "stats", "locations", "events")
+        },
+        "context": {
+            "time_frame": "current",
+            "comparison_type": "none",
+            "stat_focus": "none",
+            "sentiment": "neutral",
+            "requires_data": True,
+            "follow_up": False,
+            "data_requirements": [],
+        },
+        "is_mlb_related": True,
+        "description": description,
+    }
+
+
+def _batch(*indexes):
+    return orjson.dumps(
+        [{"index": i, "analysis": _analysis(f"query {i}")} for i in indexes]
+    ).decode()
+
+
+def test_batched_intents_follow_query_index_not_array_order():
+    agent = MLBAgent.__new__(MLBAgent)
+    intents = agent._decode_intents(_batch(3, 1, 2), 3)
+    assert [intent["description"] for intent in intents] == [
+        "query 1",
+        "query 2",
+        "query 3",
+    ]
+
+
+@pytest.mark.parametrize("indexes", [(1, 1, 3), (1, 2), (1, 2, 4)])
+def test_bad_batch_indexes_raise(indexes):
+    agent = MLBAgent.__new__(MLBAgent)
+    with pytest.raises(ValueError):
+        agent._decode_intents(_batch(*indexes), 3)
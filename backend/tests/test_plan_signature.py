@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from src.api import agent as agent_module
+from src.api.agent import MLBAgent
+
+INTENT = {
+    "intent": {"type": "schedule", "specificity": "specific", "timeframe": "today"},
+    "context": {},
+    "entities": {"teams": ["Yankees"]},
+}
+
+
+def _frozen_at(moment):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return moment
+
+    return FrozenDatetime
+
+
+def test_plan_signature_changes_at_day_rollover(monkeypatch):
+    monkeypatch.setattr(
+        agent_module, "datetime", _frozen_at(datetime(2024, 7, 1, 23, 59))
+    )
+    before_midnight = MLBAgent._plan_signature(INTENT)
+    later_same_day = MLBAgent._plan_signature(INTENT)
+
+    monkeypatch.setattr(
+        agent_module, "datetime", _frozen_at(datetime(2024, 7, 2, 0, 1))
+    )
+    after_midnight = MLBAgent._plan_signature(INTENT)
+
+    assert before_midnight == later_same_day
+    assert before_midnight != after_midnight
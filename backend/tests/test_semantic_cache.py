@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from src.api import cache as cache_module
+from src.api.cache import EMBEDDING_DIM, SemanticCache
+
+
+@pytest.fixture(autouse=True)
+def fake_embeddings(monkeypatch):
+    """One fixed unit vector per query text, without loading the encoder"""
+    vectors = {}
+
+    def embed(query):
+        if query not in vectors:
+            rng = np.random.default_rng(len(vectors))
+            vector = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+            vectors[query] = vector / np.linalg.norm(vector)
+        return vectors[query]
+
+    monkeypatch.setattr(cache_module, "embed_query", embed)
+    return embed
+
+
+def test_similar_hits_are_scoped_to_their_context():
+    cache = SemanticCache(threshold=0.87)
+    cache.put("who won last night", {"team": "NYY"}, context={"user": "a"})
+
+    assert cache.get_similar("who won last night", {"user": "a"}) == {"team": "NYY"}
+    assert cache.get_similar("who won last night", {"user": "b"}) is None
+
+
+def test_semantic_rows_are_evicted_with_l1():
+    cache = SemanticCache(threshold=0.87, maxsize=20)
+    for i in range(50):
+        cache.put(f"query {i}", i)
+
+    assert len(cache) == 20
+    assert cache.get_similar("query 0") is None
+    assert cache.get_similar("query 49") == 49
+    # Rows that moved to fill evicted slots still map to their own values
+    assert all(cache.get_similar(f"query {i}") == i for i in range(30, 50))
+
+
+def test_puts_are_persisted_on_flush(tmp_path):
+    path = str(tmp_path / "intent")
+    cache = SemanticCache(threshold=0.87, path=path)
+    cache.put("standings", "AL East", context="ctx")
+    assert not (tmp_path / "intent.pkl").exists()
+
+    cache.flush()
+    reloaded = SemanticCache(threshold=0.87, path=path)
+    assert reloaded.get_exact("standings", "ctx") == "AL East"
+    assert reloaded.get_similar("standings", "ctx") == "AL East"
+    assert reloaded.get_similar("standings", "other") is None